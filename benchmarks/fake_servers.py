@@ -0,0 +1,385 @@
+"""
+Local stand-ins for the Telegram Bot API and the OpenRouter chat completions
+endpoint used by the load test. Both are plain asyncio HTTP/1.1 servers with
+keep-alive, so they run on the same event loop as the bot without extra
+dependencies.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+logger = getLogger(__name__)
+
+
+class HTTPServer:
+    """Minimal HTTP/1.1 server. Subclasses implement handle()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._serve_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def handle(
+        self, method: str, path: str, headers: Dict[str, str], body: bytes, writer
+    ):
+        raise NotImplementedError
+
+    async def _serve_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self.handle(method, path, headers, body, writer)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(
+                f"Error in fake server {type(self).__name__}: {e}", exc_info=True
+            )
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    @staticmethod
+    def write_response(
+        writer,
+        status: int,
+        body: bytes,
+        content_type: str = "application/json",
+    ):
+        reason = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}
+        writer.write(
+            f"HTTP/1.1 {status} {reason.get(status, 'Error')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+
+    @staticmethod
+    def write_json(writer, status: int, data):
+        HTTPServer.write_response(writer, status, json.dumps(data).encode())
+
+
+class LatencyModel:
+    """Response latency: normal distribution around mean, never negative."""
+
+    def __init__(self, mean: float, jitter: float = 0.0):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sample(self) -> float:
+        if not self.jitter:
+            return self.mean
+        return max(0.0, random.gauss(self.mean, self.jitter))
+
+
+class FakeOpenRouter(HTTPServer):
+    """
+    OpenAI compatible /api/v1/chat/completions endpoint with configurable
+    latency, streaming speed and error rate. Replies are plain sentences.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        error_rate: float = 0.0,
+        reply_sentences: int = 4,
+        stream_chunk_delay: float = 0.02,
+    ):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reply_sentences = reply_sentences
+        self.stream_chunk_delay = stream_chunk_delay
+        self._ids = itertools.count(1)
+        self.requests = 0
+        self.stream_requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/api/v1"
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "stream_requests": self.stream_requests,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+    async def handle(self, method, path, headers, body, writer):
+        if method != "POST" or not path.startswith("/api/v1/chat/completions"):
+            self.write_json(writer, 404, {"error": {"message": "not found"}})
+            return
+
+        request = json.loads(body)
+        self.requests += 1
+        stream = bool(request.get("stream"))
+        if stream:
+            self.stream_requests += 1
+
+        await asyncio.sleep(self.latency.sample())
+        if random.random() < self.error_rate:
+            self.errors += 1
+            self.write_json(
+                writer, 500, {"error": {"message": "fake provider error", "code": 500}}
+            )
+            return
+
+        number = next(self._ids)
+        model = request.get("model", "fake/model")
+        sentences = [
+            f"This is sentence {i + 1} of fake reply {number}."
+            for i in range(self.reply_sentences)
+        ]
+        # Roughly 4 characters per token
+        usage = {
+            "prompt_tokens": len(json.dumps(request.get("messages", []))) // 4,
+            "completion_tokens": sum(len(s) for s in sentences) // 4,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        completion_id = f"gen-fake-{number}"
+
+        if not stream:
+            self.write_json(
+                writer,
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": " ".join(sentences),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+
+        def chunk(delta: dict, finish_reason=None, chunk_usage=None) -> dict:
+            return {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": (
+                    []
+                    if chunk_usage
+                    else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                ),
+                "usage": chunk_usage,
+            }
+
+        events = [chunk({"role": "assistant", "content": ""})]
+        events += [chunk({"content": sentence + " "}) for sentence in sentences]
+        events += [chunk({}, "stop"), chunk({}, chunk_usage=usage)]
+        for event in events:
+            data = f"data: {json.dumps(event)}\n\n".encode()
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(self.stream_chunk_delay)
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+
+
+class FakeTelegram(HTTPServer):
+    """
+    Telegram Bot API stand-in. Simulated users push messages with push_message(),
+    the bot receives them with getUpdates and its replies are recorded per chat.
+    """
+
+    BOT = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+    def __init__(self, latency: LatencyModel):
+        super().__init__()
+        self.latency = latency
+        self._updates: List[dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        # chat id -> [(time, method, text)]
+        self.activity: Dict[int, List[Tuple[float, str, str]]] = defaultdict(list)
+        self._chat_events: Dict[int, asyncio.Event] = defaultdict(asyncio.Event)
+        self.calls: Dict[str, int] = defaultdict(int)
+
+    @property
+    def base_url(self) -> str:
+        """Value for ApplicationBuilder.base_url."""
+        return f"{self.url}/bot"
+
+    def push_message(self, user_id: int, text: str) -> float:
+        """Queues a private message from the user. Returns the time it was sent."""
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {
+                "id": user_id,
+                "type": "private",
+                "first_name": f"Learner{user_id}",
+            },
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Learner{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            command_length = len(text.split()[0])
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": command_length}
+            ]
+        self._updates.append({"update_id": next(self._update_ids), "message": message})
+        self._new_update.set()
+        return time.monotonic()
+
+    async def wait_for_reply(self, chat_id: int, since: float, timeout: float) -> float:
+        """Waits for the first bot message to the chat sent after `since`. Returns its time."""
+        deadline = time.monotonic() + timeout
+        while True:
+            for sent_at, method, _ in self.activity[chat_id]:
+                if sent_at >= since and method == "sendMessage":
+                    return sent_at
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            event = self._chat_events[chat_id]
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def wait_for_quiet(self, chat_id: int, quiet: float, timeout: float) -> float:
+        """Waits until the bot did nothing in the chat for `quiet` seconds. Returns last activity."""
+        deadline = time.monotonic() + timeout
+        while True:
+            last = self.activity[chat_id][-1][0] if self.activity[chat_id] else 0.0
+            remaining = min(last + quiet, deadline) - time.monotonic()
+            if remaining <= 0:
+                return last
+            await asyncio.sleep(remaining)
+
+    async def handle(self, method, path, headers, body, writer):
+        # /bot<token>/<method>
+        api_method = path.rstrip("/").rsplit("/", 1)[-1]
+        params = self._parse_params(headers, body)
+        self.calls[api_method] += 1
+
+        if api_method == "getUpdates":
+            result = await self._get_updates(params)
+            self.write_json(writer, 200, {"ok": True, "result": result})
+            return
+
+        await asyncio.sleep(self.latency.sample())
+        if api_method == "getMe":
+            result = self.BOT
+        elif api_method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            text = str(params.get("text", ""))
+            self.activity[chat_id].append((time.monotonic(), api_method, text))
+            self._chat_events[chat_id].set()
+            message_id = params.get("message_id") or next(self._message_ids)
+            result = {
+                "message_id": int(message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": self.BOT,
+                "text": text,
+            }
+        else:
+            # deleteWebhook, sendChatAction, setMyCommands, ...
+            result = True
+        self.write_json(writer, 200, {"ok": True, "result": result})
+
+    async def _get_updates(self, params: dict) -> List[dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        # Confirmed updates are dropped, as Telegram does
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    @staticmethod
+    def _parse_params(headers: Dict[str, str], body: bytes) -> dict:
+        """python-telegram-bot posts form fields with JSON encoded non-string values."""
+        if not body:
+            return {}
+        content_type = headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        params = {}
+        for name, value in parse_qsl(body.decode(), keep_blank_values=True):
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        return params
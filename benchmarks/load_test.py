@@ -0,0 +1,319 @@
+"""
+End-to-end load test of the bot.
+
+Starts a throwaway Postgres, local stand-ins for the Telegram Bot API and
+OpenRouter, and the real application from src/run_bot.py on one event loop.
+N simulated learners then go through /start, onboarding, scenario selection
+and free conversation. Each stage is timed from the learner's message to the
+bot's first reply.
+
+The report (throughput, p50/p95/p99 per stage, DB and LLM call counts) is
+printed and saved as JSON. Pass --compare with an earlier report to see the
+difference between runs.
+
+Usage (from the project root):
+    python -m benchmarks.load_test --users 50 --messages 5 --llm-latency 1.5
+    python -m benchmarks.load_test --postgres-dsn postgresql://postgres@localhost/postgres
+    python -m benchmarks.load_test --compare benchmarks/results/<earlier report>.json
+
+Bot settings can be changed with environment variables as usual,
+e.g. STREAMING_REPLIES=true or MESSAGE_COALESCING=true.
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from benchmarks.fake_servers import FakeOpenRouter, FakeTelegram, LatencyModel
+from benchmarks.postgres import ThrowawayPostgres
+
+logger = logging.getLogger("benchmarks.load_test")
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+ONBOARDING = [
+    ("start", "/start"),
+    ("native_language", "Russian"),
+    ("target_language", "English"),
+    ("current_level", "Intermediate"),
+    ("goal", "Travel, 3 hours a week"),
+]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class LoadTest:
+    """Drives simulated learners through the bot and collects stage latencies."""
+
+    def __init__(self, args: argparse.Namespace, telegram: FakeTelegram):
+        self.args = args
+        self.telegram = telegram
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts: Dict[str, int] = defaultdict(int)
+        self.learners_done = 0
+
+    async def run_learner(self, index: int):
+        user_id = 100000 + index
+        stages = ONBOARDING + [("scenario", self.args.scenario)]
+        stages += [
+            (
+                "conversation",
+                f"Message {i + 1}: I would like to practice ordering food.",
+            )
+            for i in range(self.args.messages)
+        ]
+        # Spread the learners over the ramp-up period
+        await asyncio.sleep(random.uniform(0, self.args.ramp_up))
+
+        for stage, text in stages:
+            sent_at = self.telegram.push_message(user_id, text)
+            try:
+                replied_at = await self.telegram.wait_for_reply(
+                    user_id, sent_at, self.args.reply_timeout
+                )
+            except asyncio.TimeoutError:
+                self.timeouts[stage] += 1
+                logger.warning(f"Learner {user_id} got no reply at stage '{stage}'")
+                return
+            self.latencies[stage].append(replied_at - sent_at)
+            # Let the bot finish the stage (extra messages, streamed edits)
+            await self.telegram.wait_for_quiet(
+                user_id, self.args.settle, self.args.reply_timeout
+            )
+            await asyncio.sleep(random.uniform(0, self.args.think_time))
+        self.learners_done += 1
+
+    async def run(self) -> float:
+        start_time = time.monotonic()
+        await asyncio.gather(*(self.run_learner(i) for i in range(self.args.users)))
+        return time.monotonic() - start_time
+
+
+def collect_bot_metrics() -> dict:
+    """Reads call counts and durations from the bot's metrics registry."""
+    from src.metrics import DB_METHOD_DURATION, HANDLER_DURATION, LLM_REQUEST_DURATION
+
+    def summarize(histogram) -> dict:
+        return {
+            "/".join(labels): {"calls": count, "total_seconds": round(total, 3)}
+            for labels, (count, total) in sorted(histogram.snapshot().items())
+        }
+
+    db = summarize(DB_METHOD_DURATION)
+    return {
+        "db_calls": sum(method["calls"] for method in db.values()),
+        "db_methods": db,
+        "llm_requests": summarize(LLM_REQUEST_DURATION),
+        "handlers": summarize(HANDLER_DURATION),
+    }
+
+
+def build_report(
+    args: argparse.Namespace,
+    load_test: LoadTest,
+    duration: float,
+    telegram: FakeTelegram,
+    openrouter: FakeOpenRouter,
+) -> dict:
+    stages = {}
+    for stage in [name for name, _ in ONBOARDING] + ["scenario", "conversation"]:
+        values = load_test.latencies.get(stage, [])
+        if not values and not load_test.timeouts.get(stage):
+            continue
+        stages[stage] = {"count": len(values), "timeouts": load_test.timeouts[stage]}
+        for key, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1)):
+            value = percentile(values, fraction)
+            stages[stage][key] = round(value, 3) if value is not None else None
+    replies = sum(len(values) for values in load_test.latencies.values())
+    return {
+        "started_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "settings": {
+            key: value for key, value in vars(args).items() if key not in ("compare",)
+        },
+        "duration_seconds": round(duration, 2),
+        "learners_completed": load_test.learners_done,
+        "replies": replies,
+        "throughput_replies_per_second": round(replies / duration, 2),
+        "stages": stages,
+        "fake_openrouter": openrouter.stats(),
+        "telegram_calls": dict(telegram.calls),
+        "bot": collect_bot_metrics(),
+    }
+
+
+def print_report(report: dict, previous: dict = None):
+    def delta(current, before) -> str:
+        if before in (None, 0) or current is None:
+            return ""
+        return f" ({(current - before) / before * 100:+.0f}%)"
+
+    previous = previous or {}
+    print(
+        f"\nDuration: {report['duration_seconds']}s, "
+        f"learners completed: {report['learners_completed']}/{report['settings']['users']}, "
+        f"throughput: {report['throughput_replies_per_second']} replies/s"
+        + delta(
+            report["throughput_replies_per_second"],
+            previous.get("throughput_replies_per_second"),
+        )
+    )
+    print(
+        f"\n{'stage':<18}{'count':>7}{'p50':>16}{'p95':>16}{'p99':>16}{'timeouts':>10}"
+    )
+    for stage, stats in report["stages"].items():
+        before = previous.get("stages", {}).get(stage, {})
+        print(
+            f"{stage:<18}{stats['count']:>7}"
+            + "".join(
+                f"{str(stats[key]) + delta(stats[key], before.get(key)):>16}"
+                for key in ("p50", "p95", "p99")
+            )
+            + f"{stats['timeouts']:>10}"
+        )
+    bot = report["bot"]
+    print(
+        f"\nDB calls: {bot['db_calls']}"
+        + delta(bot["db_calls"], previous.get("bot", {}).get("db_calls"))
+    )
+    print(
+        f"LLM requests: {report['fake_openrouter']['requests']}"
+        + delta(
+            report["fake_openrouter"]["requests"],
+            previous.get("fake_openrouter", {}).get("requests"),
+        )
+        + f", errors: {report['fake_openrouter']['errors']}"
+    )
+    print(f"Telegram calls: {report['telegram_calls']}")
+
+
+def configure_environment(args: argparse.Namespace, dsn: str, openrouter_url: str):
+    """Points the bot's settings to the local stand-ins before src is imported."""
+    os.environ["DB_CONNECTION_STRING"] = dsn
+    os.environ["LLM_BASE_URL"] = openrouter_url
+    os.environ["OPENROUTER_API_KEY"] = "bench"
+    os.environ["TELEGRAM_BOT_TOKEN"] = "123456:bench"
+    os.environ.setdefault("LANGUAGE_MODEL", "bench/fake-model")
+    # Background jobs would only add noise to the measured stages
+    os.environ.setdefault("SUMMARY_ENABLED", "false")
+    os.environ.setdefault("PREGENERATION_ENABLED", "false")
+    os.environ.setdefault("METRICS_ENABLED", "false")
+
+
+async def run(args: argparse.Namespace, dsn: str) -> dict:
+    openrouter = FakeOpenRouter(
+        LatencyModel(args.llm_latency, args.llm_jitter),
+        error_rate=args.llm_error_rate,
+        reply_sentences=args.reply_sentences,
+        stream_chunk_delay=args.stream_chunk_delay,
+    )
+    telegram = FakeTelegram(LatencyModel(args.telegram_latency))
+    await openrouter.start()
+    await telegram.start()
+    configure_environment(args, dsn, openrouter.base_url)
+
+    from src.run_bot import create_application
+
+    logging.getLogger().setLevel(args.log_level)
+
+    app = create_application(base_url=telegram.base_url)
+    await app.initialize()
+    await app.post_init(app)
+    await app.updater.start_polling(poll_interval=0, timeout=5)
+    await app.start()
+    try:
+        load_test = LoadTest(args, telegram)
+        duration = await load_test.run()
+    finally:
+        # Same order as Application.run_polling
+        await app.updater.stop()
+        await app.stop()
+        await app.post_stop(app)
+        await app.shutdown()
+        await app.post_shutdown(app)
+        await telegram.stop()
+        await openrouter.stop()
+    return build_report(args, load_test, duration, telegram, openrouter)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--users", type=int, default=20, help="simulated learners")
+    parser.add_argument(
+        "--messages", type=int, default=5, help="free conversation messages per learner"
+    )
+    parser.add_argument("--scenario", default="Grammar", help="scenario to choose")
+    parser.add_argument(
+        "--ramp-up", type=float, default=5.0, help="seconds over which learners start"
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=1.0, help="max pause between messages (s)"
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=0.3,
+        help="quiet time after which a stage is considered finished (s)",
+    )
+    parser.add_argument("--reply-timeout", type=float, default=60.0)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="mean (s)")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="std dev (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--reply-sentences", type=int, default=4)
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.05)
+    parser.add_argument(
+        "--telegram-latency", type=float, default=0.05, help="Bot API latency (s)"
+    )
+    parser.add_argument(
+        "--postgres-dsn",
+        help="existing server to create a temporary database on "
+        "(default: start a temporary cluster with initdb)",
+    )
+    parser.add_argument("--output", help="report path (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="earlier report to compare with")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+
+    postgres = ThrowawayPostgres(args.postgres_dsn)
+    dsn = postgres.start()
+    try:
+        report = asyncio.run(run(args, dsn))
+    finally:
+        postgres.stop()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+    print_report(report, previous)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load_test_{dt.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nReport saved to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Throwaway Postgres for the load test: either a temporary cluster started with
+the local initdb/pg_ctl binaries, or a temporary database on an existing server.
+Both are removed by stop().
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import uuid
+from logging import getLogger
+from typing import List, Optional
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+logger = getLogger(__name__)
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "db", "sql-scripts")
+
+# Scripts that make up the current schema, in the order they are applied
+SCHEMA_SCRIPTS = [
+    "CREATE_TABLES.sql",
+    "CREATE_INDEX_MESSAGE_HISTORY_USER_TIMESTAMP.sql",
+    "CREATE_TABLE_CONVERSATION_SUMMARIES.sql",
+    "CREATE_TABLE_PRACTICE_SCHEDULES.sql",
+    "CREATE_TABLE_PREGENERATED_MESSAGES.sql",
+    "ALTER_MESSAGE_HISTORY_ADD_USAGE.sql",
+    "CREATE_TABLE_USAGE_DAILY.sql",
+]
+
+
+def find_postgres_binary(name: str) -> Optional[str]:
+    """Finds a Postgres server binary on PATH or in the pg_config bindir."""
+    path = shutil.which(name)
+    if path:
+        return path
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        bindir = subprocess.run(
+            [pg_config, "--bindir"], capture_output=True, text=True
+        ).stdout.strip()
+        candidate = os.path.join(bindir, name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_script(name: str) -> str:
+    """Reads a schema script without psql meta-commands (e.g. \\c)."""
+    with open(os.path.join(SQL_DIR, name), encoding="utf-8") as file:
+        return "\n".join(
+            line for line in file.read().splitlines() if not line.startswith("\\")
+        )
+
+
+class ThrowawayPostgres:
+    """
+    Creates an empty database with the bot's schema.
+    With `server_dsn` a database named bench_<random> is created on that server,
+    otherwise a temporary cluster is started on a free local port.
+    """
+
+    def __init__(self, server_dsn: str = None, scripts: List[str] = None):
+        self.server_dsn = server_dsn
+        self.scripts = scripts or SCHEMA_SCRIPTS
+        self.dsn: Optional[str] = None
+        self._data_dir: Optional[str] = None
+        self._pg_ctl: Optional[str] = None
+        self._database: Optional[str] = None
+
+    def start(self) -> str:
+        """Creates the database and applies the schema. Returns its connection string."""
+        if self.server_dsn:
+            self._database = f"bench_{uuid.uuid4().hex[:12]}"
+            with psycopg.connect(self.server_dsn, autocommit=True) as conn:
+                conn.execute(f'CREATE DATABASE "{self._database}"')
+            self.dsn = make_conninfo(self.server_dsn, dbname=self._database)
+        else:
+            self.dsn = self._start_cluster()
+
+        with psycopg.connect(self.dsn, autocommit=True) as conn:
+            for script in self.scripts:
+                conn.execute(read_script(script))
+        logger.info(f"Throwaway database is ready: {self._describe()}")
+        return self.dsn
+
+    def stop(self):
+        """Drops the database or stops and removes the temporary cluster."""
+        if self._database:
+            with psycopg.connect(self.server_dsn, autocommit=True) as conn:
+                conn.execute(f'DROP DATABASE IF EXISTS "{self._database}" WITH (FORCE)')
+            self._database = None
+        if self._data_dir:
+            subprocess.run(
+                [self._pg_ctl, "-D", self._data_dir, "-m", "immediate", "stop"],
+                capture_output=True,
+            )
+            shutil.rmtree(self._data_dir, ignore_errors=True)
+            self._data_dir = None
+
+    def _start_cluster(self) -> str:
+        initdb = find_postgres_binary("initdb")
+        self._pg_ctl = find_postgres_binary("pg_ctl")
+        if not initdb or not self._pg_ctl:
+            raise RuntimeError(
+                "initdb/pg_ctl not found. Install Postgres server binaries "
+                "or pass --postgres-dsn of an existing server"
+            )
+        self._data_dir = tempfile.mkdtemp(prefix="bench_pg_")
+        subprocess.run(
+            [initdb, "-D", self._data_dir, "-U", "postgres", "-A", "trust"],
+            check=True,
+            capture_output=True,
+        )
+        port = free_port()
+        # Durability is not needed for a benchmark database
+        options = (
+            f"-p {port} -k {self._data_dir} -c listen_addresses=127.0.0.1 "
+            f"-c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+        )
+        subprocess.run(
+            [
+                self._pg_ctl,
+                "-D",
+                self._data_dir,
+                "-o",
+                options,
+                "-l",
+                os.path.join(self._data_dir, "postgres.log"),
+                "-w",
+                "start",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        return make_conninfo(
+            host="127.0.0.1", port=port, user="postgres", dbname="postgres"
+        )
+
+    def _describe(self) -> str:
+        params = conninfo_to_dict(self.dsn)
+        return f"{params.get('host')}:{params.get('port')}/{params.get('dbname')}"
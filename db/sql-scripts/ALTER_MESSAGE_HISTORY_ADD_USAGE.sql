@@ -0,0 +1,6 @@
+-- LLM usage of bot messages: token_count holds the total number of tokens
+ALTER TABLE message_history
+    ADD COLUMN IF NOT EXISTS prompt_tokens INT,
+    ADD COLUMN IF NOT EXISTS completion_tokens INT,
+    ADD COLUMN IF NOT EXISTS model TEXT,
+    ADD COLUMN IF NOT EXISTS latency_ms INT;
@@ -0,0 +1,4 @@
+-- Newest-first history lookups and keyset pagination per user
+-- (see MessagesRepository.get_recent_messages / get_messages_before)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_history_user_timestamp
+    ON message_history (telegram_user_id, timestamp DESC, id DESC);
@@ -0,0 +1,8 @@
+-- Rolling per-user conversation summary maintained by src/summarizer.py.
+-- last_message_id is the high-water mark: the newest message folded into the summary.
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+    telegram_user_id BIGINT PRIMARY KEY,
+    summary TEXT NOT NULL DEFAULT '',
+    last_message_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
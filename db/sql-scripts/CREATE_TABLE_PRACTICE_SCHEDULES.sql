@@ -0,0 +1,16 @@
+-- Persistent daily practice schedule, rehydrated into the scheduler at startup
+-- (see LearningScheduler.rehydrate). One row per user and session.
+CREATE TABLE IF NOT EXISTS practice_schedules (
+    telegram_user_id BIGINT NOT NULL,
+    session_type TEXT CHECK (session_type IN ('morning', 'midday', 'evening')) NOT NULL,
+    hour SMALLINT NOT NULL,
+    minute SMALLINT NOT NULL DEFAULT 0,
+    timezone TEXT NOT NULL DEFAULT 'Europe/Istanbul',
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (telegram_user_id, session_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_practice_schedules_slot
+    ON practice_schedules (session_type, hour, minute, timezone)
+    WHERE enabled;
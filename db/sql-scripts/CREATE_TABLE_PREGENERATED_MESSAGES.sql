@@ -0,0 +1,10 @@
+-- Practice messages generated ahead of delivery (see LearningScheduler.run_pregeneration).
+-- A message is taken (deleted) when its session is delivered.
+CREATE TABLE IF NOT EXISTS pregenerated_messages (
+    telegram_user_id BIGINT NOT NULL,
+    session_type TEXT CHECK (session_type IN ('morning', 'midday', 'evening')) NOT NULL,
+    message_text TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (telegram_user_id, session_type)
+);
@@ -0,0 +1,21 @@
+-- Daily LLM usage rollups, incremented by the usage flush job (see src/usage_tracker.py).
+-- telegram_user_id 0 holds calls not made for a particular user (e.g. scenario openers).
+CREATE TABLE IF NOT EXISTS usage_daily_users (
+    day DATE NOT NULL,
+    telegram_user_id BIGINT NOT NULL,
+    requests INT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, telegram_user_id)
+);
+
+CREATE TABLE IF NOT EXISTS usage_daily_models (
+    day DATE NOT NULL,
+    model TEXT NOT NULL,
+    requests INT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    latency_ms BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, model)
+);
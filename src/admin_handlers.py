@@ -8,7 +8,18 @@ from telegram import Update
 from telegram.ext import CallbackContext
 
 from src.config import app_settings
+from src.dal import AsyncUsageRepository
+from src.dal.history_cache import history_cache
+from src.dal.profile_cache import profile_cache
+from src.llm_dispatcher import llm_dispatcher
+from src.llm_resilience import llm_caller
+from src.memory_governor import memory_governor
+from src.message_coalescer import message_coalescer
+from src.opener_cache import opener_cache
+from src.prompt_builder import prompt_token_stats
 from src.scheduler import LearningScheduler
+from src.telegram_sender import telegram_sender
+from src.tracing import format_trace, trace_recorder
 
 logger = getLogger(__name__)
 
@@ -124,3 +135,191 @@ async def trigger_morning_scenario(update: Update, context: CallbackContext) ->
             await update.message.reply_text(f"{error_msg}. Please try again later.")
     else:
         logger.warning(f"User {user_id} not authorized to trigger morning scenario.")
+
+
+def format_stats(title: str, stats: dict) -> str:
+    """Formats a dictionary of counters as a message."""
+    lines = [title] + [f"{key}: {value}" for key, value in stats.items()]
+    return "\n".join(lines)
+
+
+async def cache_stats(update: Update, context: CallbackContext) -> None:
+    """Send in-process cache counters to admin users."""
+    user_id = update.message.from_user.id
+
+    if user_id in app_settings.ADMIN_USER_IDS:
+        await update.message.reply_text(
+            format_stats("History cache:", history_cache.stats())
+            + "\n\n"
+            + format_stats("Summary cache:", history_cache.summary_stats())
+            + "\n\n"
+            + format_stats("Profile cache:", profile_cache.stats())
+            + "\n\n"
+            + format_stats("Scenario opener cache:", opener_cache.stats())
+        )
+        logger.info(f"Cache stats sent to user {user_id}.")
+    else:
+        logger.warning(
+            f"User {user_id} not authorized to perform /cache_stats command."
+        )
+
+
+async def prompt_stats(update: Update, context: CallbackContext) -> None:
+    """Send estimated vs actual prompt token counters to admin users."""
+    user_id = update.message.from_user.id
+
+    if user_id in app_settings.ADMIN_USER_IDS:
+        await update.message.reply_text(
+            format_stats("Prompt tokens:", prompt_token_stats.stats())
+        )
+        logger.info(f"Prompt stats sent to user {user_id}.")
+    else:
+        logger.warning(
+            f"User {user_id} not authorized to perform /prompt_stats command."
+        )
+
+
+async def send_stats(update: Update, context: CallbackContext) -> None:
+    """Send outbound Telegram queue depth and throughput to admin users."""
+    user_id = update.message.from_user.id
+
+    if user_id in app_settings.ADMIN_USER_IDS:
+        await update.message.reply_text(
+            format_stats("Telegram sender:", telegram_sender.stats())
+        )
+        logger.info(f"Send stats sent to user {user_id}.")
+    else:
+        logger.warning(f"User {user_id} not authorized to perform /send_stats command.")
+
+
+async def llm_stats(update: Update, context: CallbackContext) -> None:
+    """Send LLM queue, breaker, hedging and coalescing counters to admin users."""
+    user_id = update.message.from_user.id
+
+    if user_id in app_settings.ADMIN_USER_IDS:
+        await update.message.reply_text(
+            format_stats("LLM dispatcher:", llm_dispatcher.stats())
+            + "\n\n"
+            + format_stats("LLM resilience:", llm_caller.stats())
+            + "\n\n"
+            + format_stats("Message coalescing:", message_coalescer.stats())
+        )
+        logger.info(f"LLM stats sent to user {user_id}.")
+    else:
+        logger.warning(f"User {user_id} not authorized to perform /llm_stats command.")
+
+
+def format_usage(title: str, rows: List[dict]) -> str:
+    """Formats usage rollup rows as a message."""
+    lines = [title] + [
+        f"{row['name']}: {row['prompt_tokens'] + row['completion_tokens']} tokens "
+        f"({row['prompt_tokens']} prompt, {row['completion_tokens']} completion), "
+        f"{row['requests']} requests, avg {row['avg_latency_ms']} ms"
+        for row in rows
+    ]
+    if not rows:
+        lines.append("no usage")
+    return "\n".join(lines)
+
+
+async def usage_report(update: Update, context: CallbackContext) -> None:
+    """Send LLM usage per model and top users for the last N days (/usage [days]) to admin users."""
+    user_id = update.message.from_user.id
+
+    if user_id not in app_settings.ADMIN_USER_IDS:
+        logger.warning(f"User {user_id} not authorized to perform /usage command.")
+        return
+
+    try:
+        days = int(context.args[0]) if context.args else 1
+    except ValueError:
+        await update.message.reply_text("Usage: /usage [days]")
+        return
+
+    since = dt.date.today() - dt.timedelta(days=max(days, 1) - 1)
+    try:
+        models = await AsyncUsageRepository.get_models_usage(since)
+        users = await AsyncUsageRepository.get_top_users(since)
+    except Exception as e:
+        logger.error(f"Error loading usage rollups: {e}", exc_info=True)
+        await update.message.reply_text("Failed to load usage. Check logs for details.")
+        return
+
+    await update.message.reply_text(
+        format_usage(f"LLM usage per model since {since}:", models)
+        + "\n\n"
+        + format_usage("Top users:", users)
+    )
+    logger.info(f"Usage report sent to user {user_id}.")
+
+
+async def slow_traces(update: Update, context: CallbackContext) -> None:
+    """Send the slowest recent traces with their spans (/slow_traces [count]) to admin users."""
+    user_id = update.message.from_user.id
+
+    if user_id not in app_settings.ADMIN_USER_IDS:
+        logger.warning(
+            f"User {user_id} not authorized to perform /slow_traces command."
+        )
+        return
+
+    try:
+        count = int(context.args[0]) if context.args else 3
+    except ValueError:
+        await update.message.reply_text("Usage: /slow_traces [count]")
+        return
+
+    traces = trace_recorder.slowest(max(count, 1))
+    text = format_stats("Tracing:", trace_recorder.stats())
+    if not traces:
+        text += "\n\nNo slow traces recorded."
+    for trace in traces:
+        text += "\n\n" + format_trace(trace)
+    # Telegram message length limit
+    if len(text) > 4000:
+        text = text[:4000] + "\n..."
+    await update.message.reply_text(text)
+    logger.info(f"Slow traces sent to user {user_id}.")
+
+
+async def memory_report(update: Update, context: CallbackContext) -> None:
+    """
+    Send memory governor counters to admin users. /memory start|diff|stop controls
+    tracemalloc: start takes a baseline, diff shows allocations grown since the last snapshot.
+    """
+    user_id = update.message.from_user.id
+
+    if user_id not in app_settings.ADMIN_USER_IDS:
+        logger.warning(f"User {user_id} not authorized to perform /memory command.")
+        return
+
+    action = context.args[0] if context.args else ""
+    text = ""
+    try:
+        if action == "start":
+            memory_governor.start_tracemalloc()
+            text = "tracemalloc started, baseline snapshot taken.\n\n"
+        elif action == "stop":
+            memory_governor.stop_tracemalloc()
+            text = "tracemalloc stopped.\n\n"
+        elif action == "diff":
+            lines = memory_governor.snapshot_diff()
+            text = "Top allocation growth since last snapshot:\n" + (
+                "\n".join(lines) or "no changes"
+            )
+            if len(text) > 4000:
+                text = text[:4000] + "\n..."
+            await update.message.reply_text(text)
+            logger.info(f"Memory snapshot diff sent to user {user_id}.")
+            return
+        elif action:
+            await update.message.reply_text("Usage: /memory [start|diff|stop]")
+            return
+    except RuntimeError as e:
+        await update.message.reply_text(f"{e}. Use /memory start first.")
+        return
+
+    await update.message.reply_text(
+        text + format_stats("Memory governor:", memory_governor.stats())
+    )
+    logger.info(f"Memory stats sent to user {user_id}.")
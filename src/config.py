@@ -8,7 +8,7 @@ import yaml
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
-from src.logging_config import setup_logging
+from src.logging_config import log_payload, setup_logging
 
 logger = getLogger(__name__)
 
@@ -22,15 +22,159 @@ class AppSettings(BaseSettings):
 
     LANGUAGE_MODEL: str
 
+    # Shared OpenRouter client: connection pool and timeouts (seconds)
+    LLM_BASE_URL: str = "https://openrouter.ai/api/v1"
+    LLM_MAX_CONNECTIONS: int = 50
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_TIMEOUT: float = 60.0
+
+    # Streaming replies: first message is sent after the first sentence,
+    # then edited not more often than STREAM_EDIT_INTERVAL seconds
+    STREAMING_REPLIES: bool = False
+    STREAM_EDIT_INTERVAL: float = 1.5
+    STREAM_FIRST_MESSAGE_MAX_CHARS: int = 200
+
     SYSTEM_PROMPT: str = ""
     SYSTEM_PROMPTS: Dict[str, Dict[str, str]] = {}
 
     TELEGRAM_BOT_TOKEN: str
 
     DB_CONNECTION_STRING: str
+    # Async connection pool used by the bot's handlers
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+
+    # In-process cache of active users' recent turns (0 users disables it)
+    HISTORY_CACHE_MAX_USERS: int = 1000
+    HISTORY_CACHE_MAX_TURNS: int = 20
+    HISTORY_CACHE_TTL_SECONDS: float = 1800
+
+    # In-process cache of user profiles (0 users disables it)
+    PROFILE_CACHE_MAX_USERS: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: float = 3600
+
+    # Write-behind mode for message_history: inserts are queued and written
+    # in batches every MESSAGE_FLUSH_INTERVAL seconds
+    MESSAGE_WRITE_BEHIND: bool = False
+    MESSAGE_FLUSH_INTERVAL: float = 0.5
+    MESSAGE_FLUSH_BATCH_SIZE: int = 200
+
+    # Rolling conversation summaries (db/sql-scripts/CREATE_TABLE_CONVERSATION_SUMMARIES.sql):
+    # prompts contain the summary plus the messages not folded into it yet; a background
+    # job folds all but the last SUMMARY_KEEP_LAST_TURNS messages every SUMMARY_INTERVAL_MINUTES.
+    # Without summaries prompts contain the last SUMMARY_KEEP_LAST_TURNS messages
+    SUMMARY_ENABLED: bool = False
+    SUMMARY_KEEP_LAST_TURNS: int = 10
+    SUMMARY_MIN_NEW_MESSAGES: int = 10
+    SUMMARY_MAX_MESSAGES_PER_RUN: int = 100
+    SUMMARY_USERS_PER_RUN: int = 50
+    SUMMARY_MAX_TOKENS: int = 300
+    SUMMARY_INTERVAL_MINUTES: int = 30
+
+    # Token budget for the summary and history part of the prompt. The oldest
+    # turn that does not fit is shortened if at least PROMPT_MIN_TURN_TOKENS are left
+    PROMPT_HISTORY_TOKEN_BUDGET: int = 2000
+    PROMPT_MIN_TURN_TOKENS: int = 50
+    # Messages not folded into the summary yet that are loaded for the budget
+    PROMPT_MAX_HISTORY_MESSAGES: int = 100
+    # Mark the static part of the system prompt with a cache_control breakpoint
+    # (needed for prompt caching with Anthropic models, other providers cache automatically)
+    PROMPT_CACHE_CONTROL: bool = False
+
+    # Scenario openers shared by users with the same scenario and profile (languages,
+    # level and goal category). Cached openers are generated without the user's history
+    OPENER_CACHE_ENABLED: bool = False
+    OPENER_CACHE_VARIANTS: int = 3
+    OPENER_CACHE_TTL_SECONDS: float = 6 * 3600
+    OPENER_CACHE_MAX_COHORTS: int = 1000
+
+    # Practice session fan-out: concurrent deliveries and random delay per user
+    SCHEDULER_FANOUT_CONCURRENCY: int = 20
+    SCHEDULER_FANOUT_JITTER_SECONDS: float = 120
+
+    # Off-peak pre-generation of practice messages: generated every day at
+    # PREGENERATION_HOUR (Europe/Istanbul), kept for PREGENERATION_TTL_HOURS
+    PREGENERATION_ENABLED: bool = False
+    PREGENERATION_HOUR: int = 4
+    PREGENERATION_TTL_HOURS: float = 20
+    PREGENERATION_CONCURRENCY: int = 2
+
+    # Resilience of LLM calls: deadline of a call (seconds), hedged second request
+    # after LLM_HEDGE_PERCENTILE of recent latencies, circuit breaker and a
+    # cheaper/faster model used when the main one fails (empty to disable).
+    # With a fallback model the main one gets LLM_PRIMARY_DEADLINE_FRACTION of the deadline
+    LLM_REQUEST_DEADLINE: float = 30.0
+    LLM_PRIMARY_DEADLINE_FRACTION: float = 0.6
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 0.95
+    LLM_HEDGE_MIN_DELAY: float = 2.0
+    LLM_FALLBACK_MODEL: str = ""
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+
+    # LLM usage accounting: usage columns of message_history and daily rollups
+    # (db/sql-scripts/ALTER_MESSAGE_HISTORY_ADD_USAGE.sql, CREATE_TABLE_USAGE_DAILY.sql)
+    USAGE_TRACKING: bool = False
+    USAGE_FLUSH_INTERVAL: int = 60
+
+    # Memory governor (see src/memory_governor.py): GC thresholds applied at
+    # startup ([] keeps Python defaults) and RSS watermarks checked every
+    # MEMORY_CHECK_INTERVAL seconds, above which garbage is collected
+    MEMORY_GOVERNOR_ENABLED: bool = True
+    GC_THRESHOLDS: List[int] = [5000, 20, 20]
+    MEMORY_CHECK_INTERVAL: int = 30
+    MEMORY_SOFT_WATERMARK_MB: float = 400
+    MEMORY_HARD_WATERMARK_MB: float = 700
+    MEMORY_COLLECT_COOLDOWN: float = 60
+    MEMORY_TRACEMALLOC_FRAMES: int = 10
+
+    # Coalescing of rapid-fire messages: messages of a chat sent within
+    # MESSAGE_COALESCE_WINDOW seconds of each other are answered as one turn
+    MESSAGE_COALESCING: bool = False
+    MESSAGE_COALESCE_WINDOW: float = 1.5
+    MESSAGE_COALESCE_MAX_WAIT: float = 5.0
+
+    # LLM request admission: maximum concurrent requests and how many of them
+    # are kept free for interactive replies (see src/llm_dispatcher.py)
+    LLM_MAX_IN_FLIGHT: int = 16
+    LLM_INTERACTIVE_RESERVED: int = 4
+
+    # Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics)
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9464
+
+    # Per-update tracing. Traces slower than the threshold are kept for
+    # /slow_traces and a sample of them is written to logs/slow_traces.jsonl
+    TRACING_ENABLED: bool = True
+    TRACE_SLOW_THRESHOLD_SECONDS: float = 5.0
+    TRACE_SLOW_SAMPLE_RATE: float = 1.0
+    TRACE_RECENT_SLOW_TRACES: int = 50
+    TRACE_FILE_MAX_BYTES: int = 10 * 1024 * 1024
+    TRACE_FILE_BACKUP_COUNT: int = 3
+
+    # Outbound Telegram rate limits (messages per second and burst size)
+    TELEGRAM_GLOBAL_RATE: float = 25
+    TELEGRAM_GLOBAL_BURST: float = 30
+    TELEGRAM_CHAT_RATE: float = 1
+    TELEGRAM_CHAT_BURST: float = 3
+    TELEGRAM_SEND_WORKERS: int = 8
+    TELEGRAM_MAX_RETRIES: int = 3
 
     ADMIN_USER_IDS: List[int] = []
 
+    # Logging (see src/logging_config.py): handlers run on a background thread
+    # fed by a bounded queue (records are dropped when it is full), file logs
+    # can be JSON lines with user and trace ids. Prompts, LLM outputs and user
+    # messages go to logs/payloads.log, sampled and truncated
+    LOG_QUEUE: bool = True
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_JSON: bool = False
+    LOG_PAYLOAD_SAMPLE_RATE: float = 0.1
+    LOG_PAYLOAD_MAX_CHARS: int = 2000
+
     def load_all_prompts(self, dir_path="docs"):
         """Load all prompts from YAML files in the specified directory recursively."""
         root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
@@ -67,15 +211,21 @@ class AppSettings(BaseSettings):
         self.SYSTEM_PROMPT = prompts.get("system_prompt", "")
 
 
-setup_logging()
-logger.info("Loading environment variables from .env file.")
 load_dotenv()
 
 app_settings = AppSettings()
+setup_logging(
+    use_queue=app_settings.LOG_QUEUE,
+    queue_size=app_settings.LOG_QUEUE_SIZE,
+    json_format=app_settings.LOG_JSON,
+    payload_sample_rate=app_settings.LOG_PAYLOAD_SAMPLE_RATE,
+    payload_max_chars=app_settings.LOG_PAYLOAD_MAX_CHARS,
+)
+logger.info("Loaded environment variables from .env file.")
 app_settings.load_all_prompts()
 
 logger.info(f"CONFIG (LANGUAGE_MODEL): {app_settings.LANGUAGE_MODEL}")
-logger.info(f"CONFIG (SYSTEM_PROMPT): {app_settings.SYSTEM_PROMPT}")
+log_payload("CONFIG (SYSTEM_PROMPT)", app_settings.SYSTEM_PROMPT)
 
 # Scenarios and their corresponding prompts
 SCENARIO_PROMPTS = {
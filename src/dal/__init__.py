@@ -1,6 +1,12 @@
 from .users_repo import UsersRepository
 from .lessons_repo import LessonsRepository
 from .messages_repo import MessagesRepository
+from .async_users_repo import AsyncUsersRepository
+from .async_messages_repo import AsyncMessagesRepository
+from .async_summaries_repo import AsyncSummariesRepository
+from .async_schedules_repo import AsyncSchedulesRepository
+from .async_pregenerated_repo import AsyncPregeneratedRepository
+from .async_usage_repo import AsyncUsageRepository
 
 users_repo = UsersRepository()
 lessons_repo = LessonsRepository()
@@ -0,0 +1,163 @@
+import datetime as dt
+from typing import List, Dict, Union
+
+from src.config import app_settings
+from src.dal.history_cache import history_cache
+from src.dal.message_writer import message_writer, usage_to_columns
+from src.database import get_async_db_connection
+from src.dal.messages_repo import MessagesRepository
+from src.metrics import observe_db_time
+
+
+class AsyncMessagesRepository:
+    """Async version of MessagesRepository to be used from the bot's event loop."""
+
+    join_messages_to_string = staticmethod(MessagesRepository.join_messages_to_string)
+
+    @staticmethod
+    @observe_db_time
+    async def save_message(user_id, message_text, is_llm=False, usage=None):
+        """Saves a user message. `usage` is LLM usage of a bot message (see src/usage_tracker.py)."""
+        message_type = "bot" if is_llm else "user"
+
+        # Written directly if the writer is not running, e.g. during shutdown
+        if app_settings.MESSAGE_WRITE_BEHIND:
+            message = message_writer.add(user_id, message_type, message_text, usage)
+            if message is not None:
+                history_cache.append(user_id, message)
+                return
+
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                if app_settings.USAGE_TRACKING:
+                    await cursor.execute(
+                        """
+                        INSERT INTO message_history (telegram_user_id, message_type, message_text,
+                            token_count, prompt_tokens, completion_tokens, model, latency_ms)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id, timestamp;
+                        """,
+                        (user_id, message_type, message_text) + usage_to_columns(usage),
+                    )
+                else:
+                    await cursor.execute(
+                        """
+                        INSERT INTO message_history (telegram_user_id, message_type, message_text)
+                        VALUES (%s, %s, %s) RETURNING id, timestamp;
+                        """,
+                        (user_id, message_type, message_text),
+                    )
+                message_id, timestamp = await cursor.fetchone()
+            await conn.commit()
+
+        history_cache.append(
+            user_id,
+            {
+                "id": message_id,
+                "role": message_type,
+                "content": message_text,
+                "timestamp": timestamp,
+            },
+        )
+
+    @staticmethod
+    @observe_db_time
+    async def get_recent_messages(
+        user_id: int, limit: int = 50
+    ) -> List[Dict[str, Union[str, dt.datetime]]]:
+        """Gets last N user messages in chronological order."""
+        cached_messages = history_cache.get(user_id, limit)
+        if cached_messages is not None:
+            return cached_messages
+
+        # Taken before the query: a message may be written in the meantime
+        generation = history_cache.generation()
+        pending_messages = message_writer.pending_for(user_id)
+
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT id, message_type, message_text, timestamp
+                    FROM message_history
+                    WHERE telegram_user_id = %s
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                    """,
+                    (user_id, max(limit, history_cache.max_turns)),
+                )
+
+                rows = await cursor.fetchall()
+                messages_with_role = MessagesRepository.rows_to_messages(rows)
+                loaded_ids = {msg["id"] for msg in messages_with_role}
+                messages_with_role += [
+                    msg for msg in pending_messages if msg["id"] not in loaded_ids
+                ]
+                history_cache.put(user_id, messages_with_role, generation)
+                return messages_with_role[-limit:]
+
+    @staticmethod
+    async def get_messages_after(
+        user_id: int, after_id: int, limit: int = 50
+    ) -> List[Dict[str, Union[str, dt.datetime]]]:
+        """
+        Gets up to N latest user messages with ID greater than after_id (e.g. not
+        folded into the summary yet) in chronological order. Served from the recent
+        messages when they reach back to after_id.
+        """
+        recent = await AsyncMessagesRepository.get_recent_messages(
+            user_id, limit=history_cache.max_turns
+        )
+        if len(recent) < history_cache.max_turns or any(
+            msg["id"] is not None and msg["id"] <= after_id for msg in recent
+        ):
+            return [msg for msg in recent if msg["id"] is None or msg["id"] > after_id][
+                -limit:
+            ]
+        return await AsyncMessagesRepository._load_messages_after(
+            user_id, after_id, limit
+        )
+
+    @staticmethod
+    @observe_db_time
+    async def _load_messages_after(
+        user_id: int, after_id: int, limit: int
+    ) -> List[Dict[str, Union[str, dt.datetime]]]:
+        # Taken before the query: a message may be written in the meantime
+        pending_messages = message_writer.pending_for(user_id)
+
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT id, message_type, message_text, timestamp
+                    FROM message_history
+                    WHERE telegram_user_id = %s AND id > %s
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                    """,
+                    (user_id, after_id, limit),
+                )
+                messages = MessagesRepository.rows_to_messages(await cursor.fetchall())
+        loaded_ids = {msg["id"] for msg in messages}
+        messages += [msg for msg in pending_messages if msg["id"] not in loaded_ids]
+        return messages[-limit:]
+
+    @staticmethod
+    @observe_db_time
+    async def get_messages_before(
+        user_id: int, before_timestamp: dt.datetime, before_id: int, limit: int = 50
+    ) -> List[Dict[str, Union[str, dt.datetime]]]:
+        """Gets N user messages older than the cursor. See MessagesRepository.get_messages_before."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT id, message_type, message_text, timestamp
+                    FROM message_history
+                    WHERE telegram_user_id = %s AND (timestamp, id) < (%s, %s)
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                    """,
+                    (user_id, before_timestamp, before_id, limit),
+                )
+                return MessagesRepository.rows_to_messages(await cursor.fetchall())
@@ -0,0 +1,68 @@
+import datetime as dt
+from typing import Dict, List
+
+from src.database import get_async_db_connection
+from src.metrics import observe_db_time
+
+
+class AsyncPregeneratedRepository:
+    """Repository for pregenerated_messages table."""
+
+    @staticmethod
+    @observe_db_time
+    async def save_message(
+        telegram_user_id: int, session_type: str, message_text: str, ttl: dt.timedelta
+    ):
+        """Stores a pre-generated message replacing the previous one."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    INSERT INTO pregenerated_messages (telegram_user_id, session_type, message_text, expires_at)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP + %s)
+                    ON CONFLICT (telegram_user_id, session_type) DO UPDATE
+                    SET message_text = EXCLUDED.message_text,
+                        created_at = CURRENT_TIMESTAMP,
+                        expires_at = EXCLUDED.expires_at;
+                    """,
+                    (telegram_user_id, session_type, message_text, ttl),
+                )
+            await conn.commit()
+
+    @staticmethod
+    @observe_db_time
+    async def take_messages(
+        session_type: str, telegram_user_ids: List[int]
+    ) -> Dict[int, str]:
+        """
+        Takes (deletes and returns) not expired pre-generated messages of the
+        session for the given users with one query.
+        """
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    DELETE FROM pregenerated_messages
+                    WHERE session_type = %s AND telegram_user_id = ANY(%s)
+                    RETURNING telegram_user_id, message_text,
+                              expires_at > CURRENT_TIMESTAMP AS is_fresh;
+                    """,
+                    (session_type, telegram_user_ids),
+                )
+                rows = await cursor.fetchall()
+            await conn.commit()
+        return {row[0]: row[1] for row in rows if row[2]}
+
+    @staticmethod
+    @observe_db_time
+    async def delete_expired() -> int:
+        """Deletes expired messages. Returns number of deleted rows."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    DELETE FROM pregenerated_messages
+                    WHERE expires_at <= CURRENT_TIMESTAMP;
+                    """)
+                deleted = cursor.rowcount
+            await conn.commit()
+        return deleted
@@ -0,0 +1,100 @@
+from typing import Dict, List, Tuple
+
+from src.dal.users_repo import UsersRepository
+from src.database import get_async_db_connection
+from src.metrics import observe_db_time
+
+# session type, hour, minute, timezone
+Slot = Tuple[str, int, int, str]
+
+
+class AsyncSchedulesRepository:
+    """Repository for practice_schedules table."""
+
+    @staticmethod
+    @observe_db_time
+    async def backfill_default_schedules(slots: Dict[str, int], timezone: str) -> int:
+        """
+        Creates default schedules for all users that don't have them yet with one
+        statement. Returns number of created schedules.
+        """
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    INSERT INTO practice_schedules (telegram_user_id, session_type, hour, timezone)
+                    SELECT u.telegram_user_id, s.session_type, s.hour, %s
+                    FROM users u
+                    CROSS JOIN unnest(%s::text[], %s::smallint[]) AS s(session_type, hour)
+                    ON CONFLICT (telegram_user_id, session_type) DO NOTHING;
+                    """,
+                    (timezone, list(slots.keys()), list(slots.values())),
+                )
+                created = cursor.rowcount
+            await conn.commit()
+            return created
+
+    @staticmethod
+    @observe_db_time
+    async def create_default_schedules(
+        telegram_user_id: int, slots: Dict[str, int], timezone: str
+    ):
+        """Creates default schedules for one user."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    INSERT INTO practice_schedules (telegram_user_id, session_type, hour, timezone)
+                    SELECT %s, s.session_type, s.hour, %s
+                    FROM unnest(%s::text[], %s::smallint[]) AS s(session_type, hour)
+                    ON CONFLICT (telegram_user_id, session_type) DO NOTHING;
+                    """,
+                    (
+                        telegram_user_id,
+                        timezone,
+                        list(slots.keys()),
+                        list(slots.values()),
+                    ),
+                )
+            await conn.commit()
+
+    @staticmethod
+    @observe_db_time
+    async def get_slots() -> List[Tuple[Slot, int]]:
+        """Gets every distinct enabled slot with the number of users in it."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    SELECT session_type, hour, minute, timezone, COUNT(*)
+                    FROM practice_schedules
+                    WHERE enabled
+                    GROUP BY session_type, hour, minute, timezone;
+                    """)
+                rows = await cursor.fetchall()
+        return [((row[0], row[1], row[2], row[3]), row[4]) for row in rows]
+
+    @staticmethod
+    @observe_db_time
+    async def get_slot_users(
+        session_type: str, hour: int, minute: int, timezone: str
+    ) -> List[dict]:
+        """Gets profiles of all users scheduled for the slot."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT u.id, u.username, u.telegram_user_id, u.native_language,
+                           u.target_language, u.current_level, u.target_level,
+                           u.learning_goal, u.weekly_hours, u.created_at, u.updated_at
+                    FROM practice_schedules p
+                    JOIN users u ON u.telegram_user_id = p.telegram_user_id
+                    WHERE p.enabled
+                        AND p.session_type = %s
+                        AND p.hour = %s
+                        AND p.minute = %s
+                        AND p.timezone = %s;
+                    """,
+                    (session_type, hour, minute, timezone),
+                )
+                rows = await cursor.fetchall()
+        return [UsersRepository.row_to_user(row) for row in rows]
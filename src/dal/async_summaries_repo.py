@@ -0,0 +1,120 @@
+import datetime as dt
+from typing import Dict, List, Tuple, Union
+
+from src.dal.history_cache import history_cache
+from src.database import get_async_db_connection
+from src.metrics import observe_db_time
+
+
+class AsyncSummariesRepository:
+    """Repository for conversation_summaries table."""
+
+    @staticmethod
+    async def get_cached_summary_state(telegram_user_id: int) -> Tuple[str, int]:
+        """
+        Same as get_summary_state, served from the history cache.
+        Not timed itself: a cache miss is timed by get_summary_state.
+        """
+        state = history_cache.get_summary(telegram_user_id)
+        if state is not None:
+            return state
+        generation = history_cache.summary_generation()
+        state = await AsyncSummariesRepository.get_summary_state(telegram_user_id)
+        history_cache.put_summary(telegram_user_id, state, generation)
+        return state
+
+    @staticmethod
+    @observe_db_time
+    async def get_summary_state(telegram_user_id: int) -> Tuple[str, int]:
+        """Gets user's rolling summary and the ID of the last message folded into it."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT summary, last_message_id
+                    FROM conversation_summaries
+                    WHERE telegram_user_id = %s
+                    """,
+                    (telegram_user_id,),
+                )
+                row = await cursor.fetchone()
+                return (row[0], row[1]) if row else ("", 0)
+
+    @staticmethod
+    @observe_db_time
+    async def save_summary(telegram_user_id: int, summary: str, last_message_id: int):
+        """Creates or updates user's rolling summary and its high-water mark."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    INSERT INTO conversation_summaries (telegram_user_id, summary, last_message_id)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (telegram_user_id) DO UPDATE
+                    SET summary = EXCLUDED.summary,
+                        last_message_id = EXCLUDED.last_message_id,
+                        updated_at = CURRENT_TIMESTAMP;
+                    """,
+                    (telegram_user_id, summary, last_message_id),
+                )
+            await conn.commit()
+        history_cache.invalidate_summary(telegram_user_id)
+
+    @staticmethod
+    @observe_db_time
+    async def get_users_to_summarize(min_messages: int, limit: int) -> List[int]:
+        """Gets users that have at least N messages newer than their summary."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT m.telegram_user_id
+                    FROM message_history m
+                    LEFT JOIN conversation_summaries s
+                        ON s.telegram_user_id = m.telegram_user_id
+                    WHERE m.id > COALESCE(s.last_message_id, 0)
+                    GROUP BY m.telegram_user_id
+                    HAVING COUNT(*) >= %s
+                    LIMIT %s;
+                    """,
+                    (min_messages, limit),
+                )
+                return [row[0] for row in await cursor.fetchall()]
+
+    @staticmethod
+    @observe_db_time
+    async def get_messages_to_summarize(
+        telegram_user_id: int, after_id: int, keep_last: int, limit: int
+    ) -> List[Dict[str, Union[str, dt.datetime]]]:
+        """
+        Gets up to `limit` oldest messages newer than the high-water mark in
+        chronological order, leaving out the latest N messages which are sent
+        to LLM as they are.
+        """
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    WITH boundary AS (
+                        SELECT timestamp, id
+                        FROM message_history
+                        WHERE telegram_user_id = %s
+                        ORDER BY timestamp DESC, id DESC
+                        OFFSET %s
+                        LIMIT 1
+                    )
+                    SELECT m.id, m.message_type, m.message_text, m.timestamp
+                    FROM message_history m, boundary b
+                    WHERE m.telegram_user_id = %s
+                        AND m.id > %s
+                        AND (m.timestamp, m.id) <= (b.timestamp, b.id)
+                    ORDER BY m.timestamp, m.id
+                    LIMIT %s;
+                    """,
+                    (telegram_user_id, keep_last, telegram_user_id, after_id, limit),
+                )
+                rows = await cursor.fetchall()
+        return [
+            {"id": row[0], "role": row[1], "content": row[2], "timestamp": row[3]}
+            for row in rows
+        ]
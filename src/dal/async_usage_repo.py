@@ -0,0 +1,105 @@
+import datetime as dt
+from typing import Dict, List, Tuple
+
+from src.database import get_async_db_connection
+from src.metrics import observe_db_time
+
+# day, key (telegram_user_id or model), requests, prompt tokens, completion tokens, latency ms
+UsageRow = Tuple[dt.date, object, int, int, int, int]
+
+
+class AsyncUsageRepository:
+    """Repository for usage_daily_users and usage_daily_models tables."""
+
+    @staticmethod
+    @observe_db_time
+    async def add_daily_usage(user_rows: List[UsageRow], model_rows: List[UsageRow]):
+        """Adds usage counters to the daily rollups in one transaction."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                if user_rows:
+                    await cursor.executemany(
+                        """
+                        INSERT INTO usage_daily_users (day, telegram_user_id, requests,
+                            prompt_tokens, completion_tokens, latency_ms)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (day, telegram_user_id) DO UPDATE
+                        SET requests = usage_daily_users.requests + EXCLUDED.requests,
+                            prompt_tokens = usage_daily_users.prompt_tokens + EXCLUDED.prompt_tokens,
+                            completion_tokens = usage_daily_users.completion_tokens + EXCLUDED.completion_tokens,
+                            latency_ms = usage_daily_users.latency_ms + EXCLUDED.latency_ms;
+                        """,
+                        user_rows,
+                    )
+                if model_rows:
+                    await cursor.executemany(
+                        """
+                        INSERT INTO usage_daily_models (day, model, requests,
+                            prompt_tokens, completion_tokens, latency_ms)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (day, model) DO UPDATE
+                        SET requests = usage_daily_models.requests + EXCLUDED.requests,
+                            prompt_tokens = usage_daily_models.prompt_tokens + EXCLUDED.prompt_tokens,
+                            completion_tokens = usage_daily_models.completion_tokens + EXCLUDED.completion_tokens,
+                            latency_ms = usage_daily_models.latency_ms + EXCLUDED.latency_ms;
+                        """,
+                        model_rows,
+                    )
+            await conn.commit()
+
+    @staticmethod
+    @observe_db_time
+    async def get_top_users(since: dt.date, limit: int = 10) -> List[Dict]:
+        """Gets users with the most tokens used since the day (inclusive)."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT u.telegram_user_id, us.username, SUM(u.requests),
+                           SUM(u.prompt_tokens), SUM(u.completion_tokens), SUM(u.latency_ms)
+                    FROM usage_daily_users u
+                    LEFT JOIN users us ON us.telegram_user_id = u.telegram_user_id
+                    WHERE u.day >= %s
+                    GROUP BY u.telegram_user_id, us.username
+                    ORDER BY SUM(u.prompt_tokens + u.completion_tokens) DESC
+                    LIMIT %s;
+                    """,
+                    (since, limit),
+                )
+                return [
+                    AsyncUsageRepository.row_to_usage(row[1] or str(row[0]), row[2:])
+                    for row in await cursor.fetchall()
+                ]
+
+    @staticmethod
+    @observe_db_time
+    async def get_models_usage(since: dt.date) -> List[Dict]:
+        """Gets usage per model since the day (inclusive)."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT model, SUM(requests), SUM(prompt_tokens),
+                           SUM(completion_tokens), SUM(latency_ms)
+                    FROM usage_daily_models
+                    WHERE day >= %s
+                    GROUP BY model
+                    ORDER BY SUM(prompt_tokens + completion_tokens) DESC;
+                    """,
+                    (since,),
+                )
+                return [
+                    AsyncUsageRepository.row_to_usage(row[0], row[1:])
+                    for row in await cursor.fetchall()
+                ]
+
+    @staticmethod
+    def row_to_usage(name: str, counters) -> Dict:
+        requests, prompt_tokens, completion_tokens, latency_ms = counters
+        return {
+            "name": name,
+            "requests": int(requests),
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "avg_latency_ms": int(latency_ms) // max(1, int(requests)),
+        }
@@ -0,0 +1,108 @@
+from src.dal.profile_cache import profile_cache
+from src.dal.users_repo import UsersRepository
+from src.database import get_async_db_connection
+from src.metrics import observe_db_time
+
+
+class AsyncUsersRepository:
+    """Async version of UsersRepository to be used from the bot's event loop."""
+
+    @staticmethod
+    @observe_db_time
+    async def get_user_by_id(telegram_user_id):
+        """Gets user by his telegram ID. See UsersRepository.get_user_by_id."""
+        user = profile_cache.get(telegram_user_id)
+        if user is not None:
+            return dict(user)
+
+        # Taken before the query: the profile may be updated in the meantime
+        generation = profile_cache.generation()
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    SELECT id, username, telegram_user_id, native_language,
+                           target_language, current_level, target_level,
+                           learning_goal, weekly_hours, created_at, updated_at
+                    FROM users
+                    WHERE telegram_user_id = %s
+                    """,
+                    (telegram_user_id,),
+                )
+                row = await cursor.fetchone()
+                if row is None:
+                    return None
+                user = UsersRepository.row_to_user(row)
+
+        profile_cache.set(telegram_user_id, user, generation)
+        return dict(user)
+
+    @staticmethod
+    @observe_db_time
+    async def create_user(
+        username,
+        telegram_user_id,
+        native_language,
+        target_language,
+        current_level,
+        target_level="",
+        learning_goal="",
+        weekly_hours=6,
+    ):
+        """Creates a new user."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    INSERT INTO users (username, telegram_user_id, native_language, target_language, current_level, target_level, learning_goal, weekly_hours)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;
+                    """,
+                    (
+                        username,
+                        telegram_user_id,
+                        native_language,
+                        target_language,
+                        current_level,
+                        target_level,
+                        learning_goal,
+                        weekly_hours,
+                    ),
+                )
+                user_id = (await cursor.fetchone())[0]
+            await conn.commit()
+        profile_cache.pop(telegram_user_id)
+        return user_id
+
+    @staticmethod
+    @observe_db_time
+    async def update_username(telegram_user_id, new_username):
+        """Updates a user's username by his telegram ID."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    UPDATE users
+                    SET username = %s
+                    WHERE telegram_user_id = %s;
+                    """,
+                    (new_username, telegram_user_id),
+                )
+            await conn.commit()
+        profile_cache.pop(telegram_user_id)
+
+    @staticmethod
+    @observe_db_time
+    async def update_goal(telegram_user_id, new_goal):
+        """Updates a user's goal by his telegram ID."""
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    """
+                    UPDATE users
+                    SET learning_goal = %s
+                    WHERE telegram_user_id = %s;
+                    """,
+                    (new_goal, telegram_user_id),
+                )
+            await conn.commit()
+        profile_cache.pop(telegram_user_id)
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache with LRU eviction and idle TTL.
+    An entry expires when it was not accessed for ttl_seconds.
+    max_size=0 disables the cache.
+
+    Values loaded from a slow source are stored with the generation taken before
+    loading: set(key, value, generation) is skipped if the key was written
+    (set, update or pop) in the meantime, as the loaded value may be stale.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Generation of the last write of recently written keys. Older keys are
+        # forgotten, set() then assumes they changed after _forgotten_generation
+        self._generation = 0
+        self._written: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._forgotten_generation = 0
+
+    def generation(self) -> int:
+        """Returns the current write generation, taken before loading a value to set()."""
+        with self._lock:
+            return self._generation
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns cached value and marks it as recently used."""
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, generation: int = None):
+        """
+        Stores value, evicting least recently used entries when full.
+        With a generation, the value is not stored if the key was written since then.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and self._written_since(key, generation):
+                return
+            self._record_write(key)
+            self._entries[key] = [value, time.monotonic()]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, key: Hashable, func: Callable[[Any], Any]) -> bool:
+        """Applies func to the cached value in place. Returns False if key is not cached."""
+        if self.max_size <= 0:
+            return False
+        with self._lock:
+            # Also when not cached: a value being loaded misses this change
+            self._record_write(key)
+            entry = self._get_entry(key)
+            if entry is None:
+                return False
+            result = func(entry[0])
+            if result is not None:
+                entry[0] = result
+            return True
+
+    def pop(self, key: Hashable):
+        """Removes the entry if it is cached."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._record_write(key)
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _record_write(self, key: Hashable):
+        """Bumps the generation and remembers it for the key. Caller must hold the lock."""
+        self._generation += 1
+        self._written[key] = self._generation
+        self._written.move_to_end(key)
+        while len(self._written) > self.max_size:
+            _, self._forgotten_generation = self._written.popitem(last=False)
+
+    def _written_since(self, key: Hashable, generation: int) -> bool:
+        """Tells if the key may have been written after the generation. Caller must hold the lock."""
+        written = self._written.get(key)
+        if written is None:
+            written = self._forgotten_generation
+        return written > generation
+
+    def _get_entry(self, key: Hashable):
+        """Returns a live entry refreshing its access time. Caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry[1] > self.ttl_seconds:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        entry[1] = now
+        self._entries.move_to_end(key)
+        return entry
@@ -0,0 +1,85 @@
+import datetime as dt
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
+
+from src.config import app_settings
+from src.dal.cache import LRUCache
+
+Message = Dict[str, Union[str, dt.datetime]]
+
+
+class HistoryCache:
+    """
+    Write-through cache of the most recent conversation turns of active users.
+    An entry is created from a DB read of max_turns messages and then kept up to
+    date by save_message, so a later read of up to max_turns messages needs no query.
+    The users' rolling summaries are cached alongside and dropped by save_summary.
+    """
+
+    def __init__(self, max_users: int, max_turns: int, ttl_seconds: float):
+        self.max_turns = max_turns
+        self._cache = LRUCache(max_users, ttl_seconds)
+        self._summaries = LRUCache(max_users, ttl_seconds)
+
+    def get(self, user_id: int, limit: int) -> Optional[List[Message]]:
+        """Returns up to `limit` latest messages in chronological order, or None on miss."""
+        if limit > self.max_turns:
+            return None
+        messages = self._cache.get(user_id)
+        if messages is None:
+            return None
+        return list(messages)[-limit:]
+
+    def generation(self) -> int:
+        """Returns the write generation, taken before loading messages to put()."""
+        return self._cache.generation()
+
+    def put(self, user_id: int, messages: List[Message], generation: int = None):
+        """
+        Caches latest messages loaded from DB (in chronological order).
+        Skipped if a message was saved after `generation`, the loaded ones may miss it.
+        """
+        self._cache.set(
+            user_id, deque(messages, maxlen=self.max_turns), generation=generation
+        )
+
+    def append(self, user_id: int, message: Message):
+        """Adds a freshly saved message if the user's history is cached."""
+        self._cache.update(user_id, lambda messages: messages.append(message))
+
+    def invalidate(self, user_id: int):
+        """Drops the user's cached history."""
+        self._cache.pop(user_id)
+
+    def get_summary(self, user_id: int) -> Optional[Tuple[str, int]]:
+        """Returns the user's cached rolling summary and its high-water mark, or None on miss."""
+        return self._summaries.get(user_id)
+
+    def summary_generation(self) -> int:
+        """Returns the summaries' write generation, taken before loading a summary to put_summary()."""
+        return self._summaries.generation()
+
+    def put_summary(
+        self, user_id: int, summary: Tuple[str, int], generation: int = None
+    ):
+        """Caches the rolling summary and its high-water mark loaded from DB, unless it was saved after `generation`."""
+        self._summaries.set(user_id, summary, generation=generation)
+
+    def invalidate_summary(self, user_id: int):
+        """Drops the user's cached summary."""
+        self._summaries.pop(user_id)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Returns cache size and hit/miss counters."""
+        return self._cache.stats()
+
+    def summary_stats(self) -> Dict[str, Union[int, float]]:
+        """Returns summary cache size and hit/miss counters."""
+        return self._summaries.stats()
+
+
+history_cache = HistoryCache(
+    max_users=app_settings.HISTORY_CACHE_MAX_USERS,
+    max_turns=app_settings.HISTORY_CACHE_MAX_TURNS,
+    ttl_seconds=app_settings.HISTORY_CACHE_TTL_SECONDS,
+)
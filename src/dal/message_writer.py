@@ -0,0 +1,253 @@
+import atexit
+import datetime as dt
+import threading
+from collections import deque
+from logging import getLogger
+from typing import Dict, List, Optional, Union
+
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
+
+from src.config import app_settings
+from src.database import get_db_connection, release_db_connection
+
+logger = getLogger(__name__)
+
+# Errors after which the whole batch is retried later, as the database itself is unavailable
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+Message = Dict[str, Union[str, int, dt.datetime, None]]
+
+
+def usage_to_columns(usage: dict = None) -> tuple:
+    """Maps LLM usage (see src/usage_tracker.py) to message_history usage columns."""
+    if not usage:
+        return 0, None, None, None, None
+    return (
+        usage["prompt_tokens"] + usage["completion_tokens"],
+        usage["prompt_tokens"],
+        usage["completion_tokens"],
+        usage["model"],
+        usage["latency_ms"],
+    )
+
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for message_history inserts.
+    Messages are queued in memory and written by a background thread with
+    multi-row inserts and one commit per batch. A queued message is a dict in the
+    same format as MessagesRepository returns; its "id" and "timestamp" (assigned
+    by the database) are filled in once written.
+    A batch that fails while the database is reachable is split to isolate the
+    failing rows, which are retried and dropped after MAX_MESSAGE_FAILURES.
+    """
+
+    MAX_DRAIN_FAILURES = 3
+    MAX_MESSAGE_FAILURES = 3
+
+    def __init__(self, flush_interval: float, batch_size: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "deque[tuple]" = deque()
+        self._pending_by_user: Dict[int, List[Message]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the background flusher thread."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="message-writer", daemon=True
+            )
+            self._thread.start()
+        logger.info(
+            f"Message write-behind started (interval: {self.flush_interval}s, "
+            f"batch size: {self.batch_size})"
+        )
+
+    def add(
+        self, user_id: int, message_type: str, message_text: str, usage: dict = None
+    ) -> Optional[Message]:
+        """
+        Queues a message (with LLM usage of bot messages) for insert and returns its record.
+        Returns None if the writer is not running (not started yet or stopped),
+        the caller then writes the message itself.
+        """
+        message = {
+            "id": None,
+            "role": message_type,
+            "content": message_text,
+            # Replaced by the database timestamp once written
+            "timestamp": dt.datetime.now(),
+        }
+        with self._lock:
+            if self._thread is None or self._stopped.is_set():
+                return None
+            self._queue.append((user_id, message, usage, 0))
+            self._pending_by_user.setdefault(user_id, []).append(message)
+            queue_size = len(self._queue)
+        if queue_size >= self.batch_size:
+            self._wakeup.set()
+        return message
+
+    def pending_for(self, user_id: int) -> List[Message]:
+        """Returns user's messages that are queued but not written yet."""
+        with self._lock:
+            return list(self._pending_by_user.get(user_id, ()))
+
+    def size(self) -> int:
+        """Returns number of queued messages."""
+        return len(self._queue)
+
+    def flush(self) -> int:
+        """Writes one batch of queued messages. Returns number of written messages."""
+        with self._lock:
+            batch = [
+                self._queue.popleft()
+                for _ in range(min(self.batch_size, len(self._queue)))
+            ]
+        if not batch:
+            return 0
+
+        try:
+            failed = self._write(batch)
+        except Exception:
+            with self._lock:
+                # Put the unwritten messages back in their original order
+                self._queue.extendleft(
+                    reversed([entry for entry in batch if entry[1]["id"] is None])
+                )
+            raise
+
+        retried = []
+        for user_id, message, usage, failures in failed:
+            if failures + 1 < self.MAX_MESSAGE_FAILURES:
+                retried.append((user_id, message, usage, failures + 1))
+                continue
+            logger.error(
+                f"Dropped a {message['role']} message of user {user_id} "
+                f"({len(message['content'])} chars) after {failures + 1} failed inserts"
+            )
+            with self._lock:
+                self._remove_pending(user_id, message)
+        with self._lock:
+            self._queue.extendleft(reversed(retried))
+        return len(batch) - len(failed)
+
+    def _write(self, batch: List[tuple]) -> List[tuple]:
+        """
+        Inserts the batch, splitting it in halves if it fails, so that one bad
+        row does not block the others. Returns the rows that failed on their own.
+        Connection errors are raised, the rows are retried later.
+        """
+        try:
+            self._insert(batch)
+            return []
+        except CONNECTION_ERRORS:
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Error saving a message of user {batch[0][0]}: {e}")
+                return batch
+        middle = len(batch) // 2
+        return self._write(batch[:middle]) + self._write(batch[middle:])
+
+    def _insert(self, batch: List[tuple]):
+        """Inserts the batch in one transaction and fills in ids and timestamps of its messages."""
+        if app_settings.USAGE_TRACKING:
+            query = """
+                INSERT INTO message_history (telegram_user_id, message_type, message_text,
+                    token_count, prompt_tokens, completion_tokens, model, latency_ms)
+                VALUES %s RETURNING id, timestamp;
+                """
+            rows = [
+                (user_id, msg["role"], msg["content"]) + usage_to_columns(usage)
+                for user_id, msg, usage, _ in batch
+            ]
+        else:
+            query = """
+                INSERT INTO message_history (telegram_user_id, message_type, message_text)
+                VALUES %s RETURNING id, timestamp;
+                """
+            rows = [
+                (user_id, msg["role"], msg["content"]) for user_id, msg, _, _ in batch
+            ]
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                written = execute_values(
+                    cursor, query, rows, page_size=len(batch), fetch=True
+                )
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+
+        with self._lock:
+            for (user_id, message, _, _), (message_id, timestamp) in zip(
+                batch, written
+            ):
+                message["id"] = message_id
+                message["timestamp"] = timestamp
+                self._remove_pending(user_id, message)
+
+    def _remove_pending(self, user_id: int, message: Message):
+        """Removes a written or dropped message from the pending ones. Called under the lock."""
+        pending = [
+            msg for msg in self._pending_by_user.get(user_id, ()) if msg is not message
+        ]
+        if pending:
+            self._pending_by_user[user_id] = pending
+        else:
+            self._pending_by_user.pop(user_id, None)
+
+    def stop(self):
+        """Stops the flusher thread and writes everything that is still queued."""
+        if self._thread is None:
+            return
+        with self._lock:
+            # New messages are written by the callers from now on
+            self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+        failures = 0
+        while self._queue and failures < self.MAX_DRAIN_FAILURES:
+            try:
+                self.flush()
+            except Exception as e:
+                failures += 1
+                logger.error(f"Error draining message queue: {e}", exc_info=True)
+        if self._queue:
+            logger.error(f"{len(self._queue)} queued messages were not saved")
+        else:
+            logger.info("Message write-behind stopped, queue drained")
+
+    def _run(self):
+        """Flusher loop."""
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                while self.flush() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Error flushing queued messages: {e}", exc_info=True)
+
+
+message_writer = MessageWriteBuffer(
+    flush_interval=app_settings.MESSAGE_FLUSH_INTERVAL,
+    batch_size=app_settings.MESSAGE_FLUSH_BATCH_SIZE,
+)
+atexit.register(message_writer.stop)
@@ -1,60 +1,139 @@
 import datetime as dt
 from typing import List, Dict, Union
 
+from src.config import app_settings
+from src.dal.history_cache import history_cache
+from src.dal.message_writer import message_writer, usage_to_columns
 from src.database import get_db_connection, release_db_connection
+from src.metrics import observe_db_time
 
 
 class MessagesRepository:
     """Repository for conversation_history table."""
 
     @staticmethod
-    def save_message(user_id, message_text, is_llm=False):
-        """Saves a user message."""
+    @observe_db_time
+    def save_message(user_id, message_text, is_llm=False, usage=None):
+        """Saves a user message. `usage` is LLM usage of a bot message (see src/usage_tracker.py)."""
         message_type = "bot" if is_llm else "user"
 
+        # Written directly if the writer is not running, e.g. during shutdown
+        if app_settings.MESSAGE_WRITE_BEHIND:
+            message = message_writer.add(user_id, message_type, message_text, usage)
+            if message is not None:
+                history_cache.append(user_id, message)
+                return
+
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    INSERT INTO message_history (telegram_user_id, message_type, message_text)
-                    VALUES (%s, %s, %s);
-                    """,
-                    (user_id, message_type, message_text),
-                )
+                if app_settings.USAGE_TRACKING:
+                    cursor.execute(
+                        """
+                        INSERT INTO message_history (telegram_user_id, message_type, message_text,
+                            token_count, prompt_tokens, completion_tokens, model, latency_ms)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id, timestamp;
+                        """,
+                        (user_id, message_type, message_text) + usage_to_columns(usage),
+                    )
+                else:
+                    cursor.execute(
+                        """
+                        INSERT INTO message_history (telegram_user_id, message_type, message_text)
+                        VALUES (%s, %s, %s) RETURNING id, timestamp;
+                        """,
+                        (user_id, message_type, message_text),
+                    )
+                message_id, timestamp = cursor.fetchone()
                 conn.commit()
         finally:
             release_db_connection(conn)
 
+        history_cache.append(
+            user_id,
+            {
+                "id": message_id,
+                "role": message_type,
+                "content": message_text,
+                "timestamp": timestamp,
+            },
+        )
+
     @staticmethod
+    @observe_db_time
     def get_recent_messages(
         user_id: int, limit: int = 50
     ) -> List[Dict[str, Union[str, dt.datetime]]]:
-        """Gets last N user messages."""
+        """Gets last N user messages in chronological order."""
+        cached_messages = history_cache.get(user_id, limit)
+        if cached_messages is not None:
+            return cached_messages
+
+        # Taken before the query: a message may be written in the meantime
+        generation = history_cache.generation()
+        pending_messages = message_writer.pending_for(user_id)
+
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    SELECT message_type, message_text, timestamp 
+                    SELECT id, message_type, message_text, timestamp
                     FROM message_history
                     WHERE telegram_user_id = %s
-                    ORDER BY timestamp
+                    ORDER BY timestamp DESC, id DESC
                     LIMIT %s;
                     """,
-                    (user_id, limit),
+                    (user_id, max(limit, history_cache.max_turns)),
                 )
 
                 rows = cursor.fetchall()
-                messages_with_role = [
-                    {"role": row[0], "content": row[1], "timestamp": row[2]}
-                    for row in rows
+                messages_with_role = MessagesRepository.rows_to_messages(rows)
+                loaded_ids = {msg["id"] for msg in messages_with_role}
+                messages_with_role += [
+                    msg for msg in pending_messages if msg["id"] not in loaded_ids
                 ]
-                return messages_with_role
+                history_cache.put(user_id, messages_with_role, generation)
+                return messages_with_role[-limit:]
+
+        finally:
+            release_db_connection(conn)
 
+    @staticmethod
+    @observe_db_time
+    def get_messages_before(
+        user_id: int, before_timestamp: dt.datetime, before_id: int, limit: int = 50
+    ) -> List[Dict[str, Union[str, dt.datetime]]]:
+        """
+        Gets N user messages older than the cursor (timestamp and id of the oldest
+        message already loaded) in chronological order. Keyset pagination keeps
+        the cost of a page flat no matter how long the history is.
+        """
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT id, message_type, message_text, timestamp
+                    FROM message_history
+                    WHERE telegram_user_id = %s AND (timestamp, id) < (%s, %s)
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT %s;
+                    """,
+                    (user_id, before_timestamp, before_id, limit),
+                )
+                return MessagesRepository.rows_to_messages(cursor.fetchall())
         finally:
             release_db_connection(conn)
 
+    @staticmethod
+    def rows_to_messages(rows) -> List[Dict[str, Union[str, dt.datetime]]]:
+        """Converts newest-first (id, type, text, timestamp) rows to chronological messages."""
+        return [
+            {"id": row[0], "role": row[1], "content": row[2], "timestamp": row[3]}
+            for row in reversed(rows)
+        ]
+
     @staticmethod
     def join_messages_to_string(messages: List[Dict[str, Union[str, dt.datetime]]]):
         """
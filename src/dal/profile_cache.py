@@ -0,0 +1,8 @@
+from src.config import app_settings
+from src.dal.cache import LRUCache
+
+# User profiles by telegram user ID. Invalidated by UsersRepository writes.
+profile_cache = LRUCache(
+    max_size=app_settings.PROFILE_CACHE_MAX_USERS,
+    ttl_seconds=app_settings.PROFILE_CACHE_TTL_SECONDS,
+)
@@ -1,53 +1,77 @@
+from src.dal.profile_cache import profile_cache
 from src.database import get_db_connection, release_db_connection
+from src.metrics import observe_db_time
 
 
 class UsersRepository:
     """Repository for users table."""
 
     @staticmethod
+    @observe_db_time
     def get_user_by_id(telegram_user_id):
-        """Gets user by his telegram ID.
+        """Gets user by his telegram ID. Profiles are cached until the user is updated.
         Returns:
             dict: User data with keys:
-                - telegram_user_id (int)
+                - id (int)
                 - username (str)
-                - first_name (str)
-                - last_name (str)
+                - telegram_user_id (int)
                 - native_language (str)
                 - target_language (str)
+                - current_level (str)
+                - target_level (str)
+                - learning_goal (str)
+                - weekly_hours (int)
                 - created_at (datetime)
                 - updated_at (datetime)
         """
+        user = profile_cache.get(telegram_user_id)
+        if user is not None:
+            return dict(user)
+
+        # Taken before the query: the profile may be updated in the meantime
+        generation = profile_cache.generation()
         conn = get_db_connection()
         try:
             with conn.cursor() as cursor:
                 cursor.execute(
                     """
-                    SELECT * FROM users 
+                    SELECT id, username, telegram_user_id, native_language,
+                           target_language, current_level, target_level,
+                           learning_goal, weekly_hours, created_at, updated_at
+                    FROM users
                     WHERE telegram_user_id = %s
                     """,
                     (telegram_user_id,),
                 )
                 row = cursor.fetchone()
-                if row:
-                    return {
-                        "id": row[0],
-                        "username": row[1],
-                        "telegram_user_id": row[2],
-                        "native_language": row[3],
-                        "target_language": row[4],
-                        "current_level": row[5],
-                        "target_level": row[6],
-                        "learning_goal": row[7],
-                        "weekly_hours": row[8],
-                        "created_at": row[9],
-                        "updated_at": row[10],
-                    }
-                return None
+                if row is None:
+                    return None
+                user = UsersRepository.row_to_user(row)
         finally:
             release_db_connection(conn)
 
+        profile_cache.set(telegram_user_id, user, generation)
+        return dict(user)
+
+    @staticmethod
+    def row_to_user(row) -> dict:
+        """Maps a row selected with explicit users columns to user data."""
+        return {
+            "id": row[0],
+            "username": row[1],
+            "telegram_user_id": row[2],
+            "native_language": row[3],
+            "target_language": row[4],
+            "current_level": row[5],
+            "target_level": row[6],
+            "learning_goal": row[7],
+            "weekly_hours": row[8],
+            "created_at": row[9],
+            "updated_at": row[10],
+        }
+
     @staticmethod
+    @observe_db_time
     def create_user(
         username,
         telegram_user_id,
@@ -82,8 +106,10 @@ class UsersRepository:
                 return cursor.fetchone()[0]
         finally:
             release_db_connection(conn)
+            profile_cache.pop(telegram_user_id)
 
     @staticmethod
+    @observe_db_time
     def update_username(telegram_user_id, new_username):
         """Updates a user's username by his telegram ID."""
         conn = get_db_connection()
@@ -100,8 +126,10 @@ class UsersRepository:
                 conn.commit()
         finally:
             release_db_connection(conn)
+            profile_cache.pop(telegram_user_id)
 
     @staticmethod
+    @observe_db_time
     def update_goal(telegram_user_id, new_goal):
         """Updates a user's goal by his telegram ID."""
         conn = get_db_connection()
@@ -118,3 +146,4 @@ class UsersRepository:
                 conn.commit()
         finally:
             release_db_connection(conn)
+            profile_cache.pop(telegram_user_id)
@@ -1,11 +1,19 @@
+from typing import Optional
+
 from psycopg2 import pool
+from psycopg_pool import AsyncConnectionPool
 
 from src.config import app_settings
+from src.metrics import registry
 
-db_pool = pool.SimpleConnectionPool(
+# Threaded pool: connections are also taken by the message writer thread
+db_pool = pool.ThreadedConnectionPool(
     minconn=1, maxconn=10, dsn=app_settings.DB_CONNECTION_STRING
 )
 
+# Async pool lives on the bot's event loop, see init_async_db_pool
+async_db_pool: Optional[AsyncConnectionPool] = None
+
 
 def get_db_connection():
     """Gets db connection from pool."""
@@ -15,3 +23,58 @@ def get_db_connection():
 def release_db_connection(conn):
     """Realeases db connection."""
     db_pool.putconn(conn)
+
+
+async def init_async_db_pool() -> AsyncConnectionPool:
+    """Opens async db pool. Must be called on the event loop that will use it."""
+    global async_db_pool
+    if async_db_pool is None:
+        async_db_pool = AsyncConnectionPool(
+            conninfo=app_settings.DB_CONNECTION_STRING,
+            min_size=app_settings.DB_POOL_MIN_SIZE,
+            max_size=app_settings.DB_POOL_MAX_SIZE,
+            open=False,
+        )
+        await async_db_pool.open()
+    return async_db_pool
+
+
+def get_async_db_connection():
+    """Gets async db connection context manager from pool.
+    Usage: async with get_async_db_connection() as conn: ...
+    """
+    if async_db_pool is None:
+        raise RuntimeError("Async db pool is not initialized")
+    return async_db_pool.connection()
+
+
+async def close_async_db_pool():
+    """Closes async db pool."""
+    global async_db_pool
+    if async_db_pool is not None:
+        await async_db_pool.close()
+        async_db_pool = None
+
+
+def get_pool_stats():
+    """Returns connections in use and idle per pool."""
+    stats = {
+        ("sync", "used"): len(db_pool._used),
+        ("sync", "idle"): len(db_pool._pool),
+    }
+    if async_db_pool is not None:
+        async_stats = async_db_pool.get_stats()
+        stats[("async", "used")] = async_stats.get("pool_size", 0) - async_stats.get(
+            "pool_available", 0
+        )
+        stats[("async", "idle")] = async_stats.get("pool_available", 0)
+        stats[("async", "waiting")] = async_stats.get("requests_waiting", 0)
+    return stats
+
+
+registry.gauge(
+    "db_pool_connections",
+    "Database pool connections by state",
+    ["pool", "state"],
+    callback=get_pool_stats,
+)
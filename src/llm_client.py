@@ -0,0 +1,57 @@
+from logging import getLogger
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from src.config import app_settings
+
+logger = getLogger(__name__)
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def create_llm_client() -> AsyncOpenAI:
+    """Creates an OpenRouter client backed by a pool of kept-alive connections."""
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=app_settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=app_settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=app_settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            app_settings.LLM_TIMEOUT, connect=app_settings.LLM_CONNECT_TIMEOUT
+        ),
+    )
+    return AsyncOpenAI(
+        base_url=app_settings.LLM_BASE_URL,
+        api_key=app_settings.OPENROUTER_API_KEY,
+        http_client=http_client,
+    )
+
+
+def init_llm_client() -> AsyncOpenAI:
+    """Creates the shared LLM client once. Call it on the bot's event loop at startup."""
+    global _client
+    if _client is None:
+        _client = create_llm_client()
+        logger.info(
+            f"LLM client created (max connections: {app_settings.LLM_MAX_CONNECTIONS}, "
+            f"keep-alive: {app_settings.LLM_MAX_KEEPALIVE_CONNECTIONS}, "
+            f"timeout: {app_settings.LLM_TIMEOUT}s)"
+        )
+    return _client
+
+
+def get_llm_client() -> AsyncOpenAI:
+    """Returns the shared LLM client, creating it on first use."""
+    return _client if _client is not None else init_llm_client()
+
+
+async def close_llm_client():
+    """Closes the shared LLM client and its connection pool."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+        logger.info("LLM client closed")
@@ -0,0 +1,150 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import Deque, Dict, List, Tuple
+
+from src.config import app_settings
+from src.metrics import LLM_QUEUE_DURATION, registry
+from src.tracing import span
+
+logger = getLogger(__name__)
+
+# Priority classes: lower value is admitted first
+INTERACTIVE = 0
+SCHEDULED = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    SCHEDULED: "scheduled",
+    BACKGROUND: "background",
+}
+
+
+class LLMDispatcher:
+    """
+    Admission queue for LLM requests.
+    At most `max_in_flight` requests run at once; waiting requests are admitted
+    by priority class and then in arrival order. Scheduled and background
+    requests may not take the last `interactive_reserved` slots, so a broadcast
+    or a summary run never makes a live conversation wait for a free slot.
+    """
+
+    def __init__(self, max_in_flight: int, interactive_reserved: int):
+        self.max_in_flight = max_in_flight
+        self.interactive_reserved = max(0, min(interactive_reserved, max_in_flight - 1))
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._wait_times: Dict[int, Deque[float]] = {
+            priority: deque(maxlen=1000) for priority in PRIORITY_NAMES
+        }
+        self._requests: Dict[int, int] = {priority: 0 for priority in PRIORITY_NAMES}
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE):
+        """Waits for a free slot of the priority class and holds it inside the block."""
+        queued_at = time.monotonic()
+        with span("llm_queue", priority=PRIORITY_NAMES[priority]):
+            await self._acquire(priority)
+        wait_time = time.monotonic() - queued_at
+        self._wait_times[priority].append(wait_time)
+        LLM_QUEUE_DURATION.observe(wait_time, PRIORITY_NAMES[priority])
+        self._requests[priority] += 1
+        if wait_time > 1:
+            logger.info(
+                f"LLM request ({PRIORITY_NAMES[priority]}) waited {wait_time:.2f}s in queue"
+            )
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns in-flight and queued requests and queue time percentiles per class."""
+        stats = {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": len(self._waiters),
+        }
+        for priority, name in PRIORITY_NAMES.items():
+            wait_times = sorted(self._wait_times[priority])
+            stats[f"{name}_requests"] = self._requests[priority]
+            stats[f"{name}_queued"] = sum(
+                1 for waiter in self._waiters if waiter[0] == priority
+            )
+            if wait_times:
+                stats[f"{name}_wait_p50_ms"] = round(
+                    wait_times[len(wait_times) // 2] * 1000
+                )
+                stats[f"{name}_wait_p95_ms"] = round(
+                    wait_times[int(len(wait_times) * 0.95)] * 1000
+                )
+        return stats
+
+    def _limit(self, priority: int) -> int:
+        if priority == INTERACTIVE:
+            return self.max_in_flight
+        return self.max_in_flight - self.interactive_reserved
+
+    async def _acquire(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._wake_up()
+        if future.done():
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over right before cancellation
+                self._release()
+            else:
+                self._waiters = [
+                    waiter for waiter in self._waiters if waiter[2] is not future
+                ]
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake_up()
+
+    def _wake_up(self):
+        """Hands free slots over to waiters in priority order."""
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self._limit(priority):
+                # Lower classes wait behind the head of the queue
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            future.set_result(None)
+
+
+llm_dispatcher = LLMDispatcher(
+    max_in_flight=app_settings.LLM_MAX_IN_FLIGHT,
+    interactive_reserved=app_settings.LLM_INTERACTIVE_RESERVED,
+)
+
+registry.gauge(
+    "llm_in_flight",
+    "LLM requests running now",
+    callback=lambda: llm_dispatcher.in_flight,
+)
+registry.gauge(
+    "llm_queued",
+    "LLM requests waiting for a free slot by priority class",
+    ["priority"],
+    callback=lambda: {
+        (name,): sum(1 for waiter in llm_dispatcher._waiters if waiter[0] == priority)
+        for priority, name in PRIORITY_NAMES.items()
+    },
+)
@@ -0,0 +1,288 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.config import app_settings
+from src.metrics import registry
+
+logger = getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling LLM provider while it is considered unhealthy."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_seconds`. Then one trial call is let through (half-open): its success
+    closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        """Returns True if a call may be made now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = HALF_OPEN
+            self._trial_running = False
+        if self._trial_running:
+            return False
+        self._trial_running = True
+        return True
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("LLM circuit breaker closed")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_cancelled(self):
+        """The call was cancelled by the caller, it says nothing about the provider."""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(
+                f"LLM circuit breaker opened after {self.failures} failures, "
+                f"retrying in {self.reset_seconds}s"
+            )
+
+
+class ResilientCaller:
+    """
+    Runs LLM calls with a deadline, a hedged second request and a circuit breaker.
+    When the primary model fails, times out or its breaker is open, the call is
+    made with the fallback model (if configured) within the remaining deadline.
+    With a fallback model the primary gets only `primary_deadline_fraction` of
+    the deadline, so that a slow provider leaves time for the fallback.
+    """
+
+    def __init__(
+        self,
+        deadline: float,
+        hedge_enabled: bool,
+        hedge_percentile: float,
+        hedge_min_delay: float,
+        fallback_model: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        primary_deadline_fraction: float = 1.0,
+    ):
+        self.deadline = deadline
+        self.primary_deadline_fraction = primary_deadline_fraction
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.fallback_model = fallback_model
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._latencies = deque(maxlen=500)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    async def call(
+        self, model: str, request: Callable[[str], Awaitable], deadline: float = None
+    ):
+        """
+        Calls `request(model_name)` and returns its result. Errors are raised to the
+        caller when neither the model nor the fallback model produced a result.
+        """
+        deadline = deadline or self.deadline
+        deadline_at = time.monotonic() + deadline
+        primary_deadline = deadline
+        if self.fallback_model and self.fallback_model != model:
+            primary_deadline = deadline * self.primary_deadline_fraction
+        try:
+            if not self.breaker.allow():
+                self.rejected += 1
+                raise CircuitOpenError("LLM provider is unavailable (circuit open)")
+            try:
+                result = await asyncio.wait_for(
+                    self._hedged(model, request), primary_deadline
+                )
+            except asyncio.CancelledError:
+                self.breaker.record_cancelled()
+                raise
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.breaker.record_failure()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return result
+        except Exception as e:
+            remaining = deadline_at - time.monotonic()
+            if (
+                not self.fallback_model
+                or self.fallback_model == model
+                or remaining <= 0
+            ):
+                raise
+            logger.warning(
+                f"Calling fallback model {self.fallback_model} "
+                f"({type(e).__name__}: {e})"
+            )
+            self.fallbacks += 1
+            return await asyncio.wait_for(request(self.fallback_model), remaining)
+
+    def model_for_stream(self, model: str) -> str:
+        """
+        Chooses the model of a streamed call, which is not hedged:
+        the fallback model while the breaker is open.
+        """
+        if self.breaker.allow() or not self.fallback_model:
+            return model
+        self.fallbacks += 1
+        return self.fallback_model
+
+    @contextmanager
+    def stream_outcome(self, model: str, primary_model: str):
+        """
+        Records the outcome of a streamed call (use as a context manager around
+        the whole stream). Only calls of the primary model update the breaker.
+        A stream closed or cancelled by its consumer (GeneratorExit, CancelledError)
+        says nothing about the provider, but it must end a half-open trial.
+        """
+        tracked = model == primary_model
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if tracked:
+                self.breaker.record_failure()
+            raise
+        except Exception:
+            if tracked:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            if tracked:
+                self.breaker.record_cancelled()
+            raise
+        if tracked:
+            self.breaker.record_success()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns breaker state, hedge and fallback counters."""
+        hedge_delay = self._hedge_delay()
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_failures": self.breaker.failures,
+            "breaker_opened": self.breaker.times_opened,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "hedge_delay_s": round(hedge_delay, 2) if hedge_delay else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+        }
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Latency percentile after which a second request is sent."""
+        if not self.hedge_enabled or len(self._latencies) < 20:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile))
+        return max(self.hedge_min_delay, latencies[index])
+
+    async def _timed(self, model: str, request: Callable[[str], Awaitable]):
+        start_time = time.monotonic()
+        result = await request(model)
+        self._latencies.append(time.monotonic() - start_time)
+        return result
+
+    async def _hedged(self, model: str, request: Callable[[str], Awaitable]):
+        """Sends a second request if the first one is slower than usual."""
+        primary = asyncio.ensure_future(self._timed(model, request))
+        hedge = None
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._timed(model, request))
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+llm_caller = ResilientCaller(
+    deadline=app_settings.LLM_REQUEST_DEADLINE,
+    hedge_enabled=app_settings.LLM_HEDGE_ENABLED,
+    hedge_percentile=app_settings.LLM_HEDGE_PERCENTILE,
+    hedge_min_delay=app_settings.LLM_HEDGE_MIN_DELAY,
+    fallback_model=app_settings.LLM_FALLBACK_MODEL,
+    failure_threshold=app_settings.LLM_BREAKER_FAILURE_THRESHOLD,
+    reset_seconds=app_settings.LLM_BREAKER_RESET_SECONDS,
+    primary_deadline_fraction=app_settings.LLM_PRIMARY_DEADLINE_FRACTION,
+)
+
+registry.gauge(
+    "llm_breaker_open",
+    "1 if the LLM circuit breaker is open, 0.5 if half-open, 0 if closed",
+    callback=lambda: {CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}[llm_caller.breaker.state],
+)
+registry.counter(
+    "llm_resilience_events_total",
+    "Counters of LLM resilience events: breaker openings, rejected calls, timeouts, "
+    "hedged requests, hedges that won and fallback model calls",
+    ["event"],
+    callback=lambda: {
+        ("breaker_opened",): llm_caller.breaker.times_opened,
+        ("rejected",): llm_caller.rejected,
+        ("timeouts",): llm_caller.timeouts,
+        ("hedges",): llm_caller.hedges,
+        ("hedge_wins",): llm_caller.hedge_wins,
+        ("fallbacks",): llm_caller.fallbacks,
+    },
+)
@@ -1,17 +1,188 @@
+import atexit
+import copy
 import datetime as dt
+import json
 import logging
 import logging.config
 import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Callable, List, Optional, Tuple
 
 # Get the root directory of the project
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
 LOG_DIR = os.path.join(ROOT_DIR, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)  # Ensure the log directory exists
 
+# Large payloads (prompts, LLM outputs, user messages) are logged to their own channel
+PAYLOAD_LOGGER_NAME = "payloads"
+
+_listeners: List[QueueListener] = []
+_queue_size = 0
+_payload_sample_rate = 1.0
+_payload_max_chars = 0
+
+
+def _no_context() -> Tuple[Optional[int], Optional[str]]:
+    return None, None
+
+
+# Returns (user_id, trace_id) of the update being handled, registered by src.tracing
+_record_context: Callable[[], Tuple[Optional[int], Optional[str]]] = _no_context
+
+
+def set_record_context(provider: Callable[[], Tuple[Optional[int], Optional[str]]]):
+    global _record_context
+    _record_context = provider
+
+
+class ContextFilter(logging.Filter):
+    """Adds user_id and trace_id of the current update to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.user_id, record.trace_id = _record_context()
+        return True
+
+
+def _exception_text(formatter: logging.Formatter, record: logging.LogRecord) -> str:
+    """
+    Formatted exception of a record. Records passed through the log queue only
+    have exc_text, their exc_info is cleared by DroppingQueueHandler.prepare.
+    """
+    if record.exc_info and not record.exc_text:
+        record.exc_text = formatter.formatException(record.exc_info)
+    return record.exc_text or ""
+
+
+class DetailedFormatter(logging.Formatter):
+    """Text formatter printing the exception of a record in its own section."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = record.getMessage()
+        record.asctime = self.formatTime(record, self.datefmt)
+        text = self.formatMessage(record)
+        exception = _exception_text(self, record)
+        if exception:
+            text += f"\n---[Exception]---\n{exception}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines with user and trace ids."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("user_id", "trace_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        exception = _exception_text(self, record)
+        if exception:
+            data["exception"] = exception
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+_plain_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the caller: when the background thread
+    falls behind (e.g. a slow disk) records are dropped and counted.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Unlike QueueHandler.prepare, keeps the traceback out of the message: it is
+        formatted here (exc_info is not usable on the logging thread) and kept in
+        exc_text, so that formatters print it in their own way.
+        """
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = _exception_text(_plain_formatter, record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def make_background_handler(*handlers: logging.Handler) -> logging.Handler:
+    """
+    Returns a handler passing records to the given handlers. In queue mode the
+    handlers run on a background thread, otherwise they are used directly.
+    """
+    if not _queue_size:
+        if len(handlers) == 1:
+            handlers[0].addFilter(ContextFilter())
+            return handlers[0]
+        raise ValueError("Several handlers can only be combined in queue mode")
+    queue_handler = DroppingQueueHandler(queue.Queue(_queue_size))
+    # Context variables are only available in the thread that logs the record
+    queue_handler.addFilter(ContextFilter())
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return queue_handler
+
+
+def stop_logging():
+    """Writes out queued records and stops the background threads."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def log_payload(kind: str, text: str):
+    """
+    Logs a large payload to the payload channel (logs/payloads.log), sampled
+    at LOG_PAYLOAD_SAMPLE_RATE and truncated to LOG_PAYLOAD_MAX_CHARS.
+    """
+    if _payload_sample_rate < 1 and random.random() >= _payload_sample_rate:
+        return
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+    if not payload_logger.isEnabledFor(logging.INFO):
+        return
+    text = text or ""
+    length = len(text)
+    if _payload_max_chars and length > _payload_max_chars:
+        text = text[:_payload_max_chars] + "..."
+    payload_logger.info(f"{kind} ({length} chars): {text}")
+
+
+def setup_logging(
+    use_queue: bool = False,
+    queue_size: int = 10000,
+    json_format: bool = False,
+    payload_sample_rate: float = 1.0,
+    payload_max_chars: int = 0,
+):
+    """
+    Configures console and file logging. With use_queue, handlers run on a
+    background thread so that logging never waits for the disk or console.
+    """
+    global _queue_size, _payload_sample_rate, _payload_max_chars
+    stop_logging()
+    _queue_size = queue_size if use_queue else 0
+    _payload_sample_rate = payload_sample_rate
+    _payload_max_chars = payload_max_chars
 
-def setup_logging():
     # Create a timestamp for the log file name. Format: YYYYMMDD
     timestamp = dt.datetime.now().strftime("%Y%m%d")
+    file_formatter = "json" if json_format else "default"
 
     logging.config.dictConfig(
         {
@@ -22,10 +193,11 @@ def setup_logging():
                     "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
                 },
                 "detailed": {  # Formatter for detailed exception logs
-                    "format": (
-                        "%(asctime)s - %(name)s - %(levelname)s - %(message)s\n"
-                        "---[Exception]---\n%(exc_info)s"
-                    ),
+                    "()": DetailedFormatter,
+                    "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                },
+                "json": {  # Structured records with user and trace ids
+                    "()": JsonFormatter,
                 },
                 "console": {  # Formatter for console output
                     "format": "%(levelname)s - %(message)s",
@@ -39,7 +211,7 @@ def setup_logging():
                     "interval": 1,  # Every day
                     "backupCount": 5,  # Keep 5 backups
                     "level": "INFO",
-                    "formatter": "default",
+                    "formatter": file_formatter,
                     "encoding": "utf-8",
                 },
                 "error_file_handler": {
@@ -49,7 +221,7 @@ def setup_logging():
                     "interval": 1,  # Every day
                     "backupCount": 5,  # Keep 5 backups
                     "level": "ERROR",
-                    "formatter": "detailed",
+                    "formatter": "json" if json_format else "detailed",
                     "encoding": "utf-8",
                 },
                 "console_handler": {  # StreamHandler for console output
@@ -83,3 +255,33 @@ def setup_logging():
             },
         }
     )
+
+    root_logger = logging.getLogger()
+    if use_queue:
+        # The configured handlers move to the background thread
+        background_handler = make_background_handler(*root_logger.handlers)
+        for logger in (root_logger, logging.getLogger("pyrogram")):
+            logger.handlers = [background_handler]
+    else:
+        for handler in root_logger.handlers:
+            handler.addFilter(ContextFilter())
+
+    payload_handler = RotatingFileHandler(
+        os.path.join(LOG_DIR, "payloads.log"),
+        maxBytes=20 * 1024 * 1024,
+        backupCount=3,
+        encoding="utf-8",
+        delay=True,
+    )
+    payload_handler.setFormatter(
+        JsonFormatter()
+        if json_format
+        else logging.Formatter("%(asctime)s - %(name)s - %(message)s")
+    )
+    payload_logger = logging.getLogger(PAYLOAD_LOGGER_NAME)
+    payload_logger.handlers = [make_background_handler(payload_handler)]
+    payload_logger.setLevel(logging.INFO)
+    payload_logger.propagate = False
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,180 @@
+import gc
+import linecache
+import threading
+import time
+import tracemalloc
+from logging import getLogger
+from typing import Dict, List, Optional, Sequence
+
+import psutil
+
+from src.config import app_settings
+from src.metrics import registry
+
+logger = getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class MemoryGovernor:
+    """
+    Replaces forced garbage collection on the request path.
+    GC thresholds are tuned once at startup, and collections run only when RSS
+    crosses the soft (young generations) or hard (full collection) watermark.
+    Leaks are investigated with tracemalloc snapshot diffs (see /memory).
+    """
+
+    def __init__(
+        self,
+        soft_watermark_mb: float,
+        hard_watermark_mb: float,
+        collect_cooldown: float,
+        gc_thresholds: Sequence[int],
+        tracemalloc_frames: int,
+        min_check_interval: float = 1.0,
+    ):
+        self.soft_watermark = soft_watermark_mb * MB
+        self.hard_watermark = hard_watermark_mb * MB
+        self.collect_cooldown = collect_cooldown
+        self.gc_thresholds = tuple(gc_thresholds)
+        self.tracemalloc_frames = tracemalloc_frames
+        self.min_check_interval = min_check_interval
+        self._process = psutil.Process()
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._last_collect = 0.0
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self.checks = 0
+        self.young_collections = 0
+        self.full_collections = 0
+        self.freed_objects = 0
+
+    def configure_gc(self):
+        """
+        Applies GC thresholds and moves objects created during startup (modules,
+        prompts, clients) to the permanent generation, so that full collections
+        do not scan them again.
+        """
+        if self.gc_thresholds:
+            gc.set_threshold(*self.gc_thresholds)
+        gc.freeze()
+        logger.info(
+            f"GC thresholds set to {gc.get_threshold()}, "
+            f"{gc.get_freeze_count()} startup objects frozen"
+        )
+
+    def rss(self) -> int:
+        return self._process.memory_info().rss
+
+    def check(self) -> Optional[str]:
+        """
+        Collects garbage if RSS is above a watermark and the cooldown has passed.
+        Returns the kind of collection that ran ("young" or "full") or None.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._last_check = now
+            self.checks += 1
+            rss = self.rss()
+            if (
+                rss < self.soft_watermark
+                or now - self._last_collect < self.collect_cooldown
+            ):
+                return None
+            self._last_collect = now
+            start_time = time.perf_counter()
+            if rss >= self.hard_watermark:
+                kind = "full"
+                freed = gc.collect()
+                self.full_collections += 1
+            else:
+                kind = "young"
+                freed = gc.collect(1)
+                self.young_collections += 1
+            self.freed_objects += freed
+            logger.info(
+                f"RSS {rss / MB:.1f}MB above {kind} collection watermark: "
+                f"collected {freed} objects in {(time.perf_counter() - start_time) * 1000:.1f}ms, "
+                f"RSS now {self.rss() / MB:.1f}MB"
+            )
+            return kind
+
+    def maybe_collect(self) -> Optional[str]:
+        """Cheap check for the request path, e.g. after large allocations such as audio files."""
+        if time.monotonic() - self._last_check < self.min_check_interval:
+            return None
+        return self.check()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "rss_mb": round(self.rss() / MB, 1),
+            "soft_watermark_mb": round(self.soft_watermark / MB),
+            "hard_watermark_mb": round(self.hard_watermark / MB),
+            "gc_thresholds": gc.get_threshold(),
+            "gc_counts": gc.get_count(),
+            "frozen_objects": gc.get_freeze_count(),
+            "checks": self.checks,
+            "young_collections": self.young_collections,
+            "full_collections": self.full_collections,
+            "freed_objects": self.freed_objects,
+            "tracemalloc": tracemalloc.is_tracing(),
+        }
+
+    def start_tracemalloc(self):
+        """Starts allocation tracing and takes the baseline snapshot."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+        self._snapshot = self._take_snapshot()
+
+    def stop_tracemalloc(self):
+        tracemalloc.stop()
+        self._snapshot = None
+
+    def snapshot_diff(self, limit: int = 10) -> List[str]:
+        """
+        Compares allocations with the previous snapshot and returns the lines that
+        grew most. The new snapshot becomes the baseline.
+        """
+        if not tracemalloc.is_tracing() or self._snapshot is None:
+            raise RuntimeError("tracemalloc is not running")
+        snapshot = self._take_snapshot()
+        stats = snapshot.compare_to(self._snapshot, "traceback")
+        self._snapshot = snapshot
+        lines = []
+        for stat in stats[:limit]:
+            frame = stat.traceback[0]
+            source = linecache.getline(frame.filename, frame.lineno).strip()
+            lines.append(
+                f"{stat.size_diff / 1024:+.1f}KiB ({stat.count_diff:+d} blocks) "
+                f"{frame.filename}:{frame.lineno} {source}"
+            )
+        return lines
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            )
+        )
+
+
+memory_governor = MemoryGovernor(
+    soft_watermark_mb=app_settings.MEMORY_SOFT_WATERMARK_MB,
+    hard_watermark_mb=app_settings.MEMORY_HARD_WATERMARK_MB,
+    collect_cooldown=app_settings.MEMORY_COLLECT_COOLDOWN,
+    gc_thresholds=app_settings.GC_THRESHOLDS,
+    tracemalloc_frames=app_settings.MEMORY_TRACEMALLOC_FRAMES,
+)
+
+registry.counter(
+    "memory_governor_collections_total",
+    "Garbage collections triggered by RSS watermarks",
+    ["kind"],
+    callback=lambda: {
+        ("young",): memory_governor.young_collections,
+        ("full",): memory_governor.full_collections,
+    },
+)
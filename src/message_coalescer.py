@@ -0,0 +1,113 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, List
+
+from src.config import app_settings
+from src.tracing import detach_trace
+
+logger = getLogger(__name__)
+
+Respond = Callable[[str], Awaitable[None]]
+
+
+class PendingTurn:
+    """User messages of a chat waiting to be answered together."""
+
+    def __init__(self, respond: Respond):
+        self.texts: List[str] = []
+        self.respond = respond
+        self.first_added_at = time.monotonic()
+        self.last_added_at = self.first_added_at
+
+
+class MessageCoalescer:
+    """
+    Merges rapid-fire messages of a chat into one LLM turn.
+    A turn is answered once no new message arrived for `window` seconds (but not
+    later than `max_wait` seconds after its first message). Messages that arrive
+    while a turn is answered form the next turn, so replies of a chat never overlap.
+    """
+
+    def __init__(self, window: float, max_wait: float):
+        self.window = window
+        self.max_wait = max(window, max_wait)
+        self._pending: Dict[int, PendingTurn] = {}
+        self._runners: Dict[int, asyncio.Task] = {}
+        self.messages = 0
+        self.turns = 0
+
+    def submit(self, chat_id: int, text: str, respond: Respond):
+        """
+        Adds the message to the chat's pending turn.
+        The turn is answered by the latest `respond` callback with all its messages joined.
+        """
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            pending = self._pending[chat_id] = PendingTurn(respond)
+        pending.texts.append(text)
+        pending.respond = respond
+        pending.last_added_at = time.monotonic()
+        self.messages += 1
+
+        if chat_id not in self._runners:
+            self._runners[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    async def stop(self):
+        """Cancels pending turns. Their messages are already saved to history."""
+        runners = list(self._runners.values())
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        if self._pending:
+            logger.warning(f"Dropped pending turns of {len(self._pending)} chats")
+        self._pending.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns number of received messages and answered turns."""
+        return {
+            "messages": self.messages,
+            "turns": self.turns,
+            "pending_chats": len(self._pending),
+        }
+
+    async def _run(self, chat_id: int):
+        """Answers the chat's turns one after another until nothing is pending."""
+        # The runner outlives the handler that started it, turns are traced on their own
+        detach_trace()
+        try:
+            while chat_id in self._pending:
+                await self._wait_for_quiet(self._pending[chat_id])
+                pending = self._pending.pop(chat_id)
+                self.turns += 1
+                if len(pending.texts) > 1:
+                    logger.info(
+                        f"Coalesced {len(pending.texts)} messages of chat {chat_id} into one turn"
+                    )
+                try:
+                    await pending.respond("\n".join(pending.texts))
+                except Exception as e:
+                    logger.error(
+                        f"Error answering messages of chat {chat_id}: {e}",
+                        exc_info=True,
+                    )
+        finally:
+            self._runners.pop(chat_id, None)
+
+    async def _wait_for_quiet(self, pending: PendingTurn):
+        """Sleeps until the debounce window of the turn has passed."""
+        while True:
+            deadline = min(
+                pending.last_added_at + self.window,
+                pending.first_added_at + self.max_wait,
+            )
+            delay = deadline - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+message_coalescer = MessageCoalescer(
+    window=app_settings.MESSAGE_COALESCE_WINDOW,
+    max_wait=app_settings.MESSAGE_COALESCE_MAX_WAIT,
+)
@@ -0,0 +1,428 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from logging import getLogger
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import psutil
+
+from src.config import app_settings
+from src.logging_config import DroppingQueueHandler
+from src.tracing import span, start_trace
+
+logger = getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# Seconds: from sub-millisecond DB queries up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class of a metric family with optional label names."""
+
+    type = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class ValueMetric(Metric):
+    """
+    Metric with a single value per label set.
+    A metric with a callback is read when metrics are scraped; the callback
+    returns a value or a dict of label values tuple to value. Components that
+    already keep their own counters expose them this way at no cost per call.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        callback: Callable[[], object] = None,
+    ):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception as e:
+                logger.error(f"Error collecting metric {self.name}: {e}")
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            values = [(labels, value) for labels, value in values.items()]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+            for labels, value in values
+            if value is not None
+        ]
+
+
+class Counter(ValueMetric):
+    """Monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(ValueMetric):
+    """Value that goes up and down per label set."""
+
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets per label set."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            state[0][index] += 1
+            state[1] += value
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[int, float]]:
+        """Returns number and sum of observations per label set."""
+        with self._lock:
+            return {
+                labels: (sum(counts), total)
+                for labels, (counts, total) in self._values.items()
+            }
+
+    def time(self, *label_values):
+        """Context manager observing duration of the block in seconds."""
+        return _Timer(self, label_values)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [
+                (labels, list(counts), total)
+                for labels, (counts, total) in self._values.items()
+            ]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(
+                    self.label_names + ("le",), labels + (le,)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_str = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {total!r}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start_time")
+
+    def __init__(self, histogram: Histogram, label_values: LabelValues):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(
+            time.perf_counter() - self.start_time, *self.label_values
+        )
+        return False
+
+
+class Registry:
+    """Collection of metrics rendered together in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        callback: Callable[[], object] = None,
+    ) -> Counter:
+        return self.register(Counter(name, help_text, labels, callback))
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        callback: Callable[[], object] = None,
+    ) -> Gauge:
+        return self.register(Gauge(name, help_text, labels, callback))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Hot path metrics. Gauges of components (pools, queues, breaker) are
+# registered with callbacks next to the components
+DB_METHOD_DURATION = registry.histogram(
+    "db_method_duration_seconds",
+    "Duration of repository methods (including cache hits)",
+    ["method"],
+)
+LLM_REQUEST_DURATION = registry.histogram(
+    "llm_request_duration_seconds",
+    "Duration of LLM requests without queue time",
+    ["model", "kind"],
+)
+LLM_QUEUE_DURATION = registry.histogram(
+    "llm_queue_duration_seconds",
+    "Time LLM requests waited for a free slot",
+    ["priority"],
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens used by LLM requests", ["model", "type"]
+)
+LLM_ERRORS = registry.counter("llm_errors_total", "Failed LLM requests", ["kind"])
+HANDLER_DURATION = registry.histogram(
+    "handler_duration_seconds",
+    "Duration of Telegram update handlers and of replies since the message was received",
+    ["handler"],
+)
+TELEGRAM_SEND_DURATION = registry.histogram(
+    "telegram_send_duration_seconds",
+    "Duration of outbound Telegram API calls without queue time",
+    ["status"],
+)
+SCHEDULER_SLOT_DURATION = registry.histogram(
+    "scheduler_slot_duration_seconds",
+    "Duration of scheduled practice slot runs",
+    ["session_type"],
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+VOICE_TRANSCRIPTION_DURATION = registry.histogram(
+    "voice_transcription_duration_seconds",
+    "Duration of voice message download and transcription",
+    ["status"],
+)
+
+
+def timed(histogram: Histogram, trace: Callable = span):
+    """
+    Returns a decorator recording duration of a sync or async function
+    in the histogram, labeled with the function's qualified name.
+    The function also runs in a tracing span (or trace) of the same name.
+    """
+
+    def decorator(func):
+        name = func.__qualname__
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_time = time.perf_counter()
+                try:
+                    with trace(name):
+                        return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start_time, name)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                with trace(name):
+                    return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start_time, name)
+
+        return wrapper
+
+    return decorator
+
+
+observe_db_time = timed(DB_METHOD_DURATION)
+# Each update handled by the bot is a trace
+observe_handler_time = timed(HANDLER_DURATION, trace=start_trace)
+
+
+def _process_memory():
+    memory_info = psutil.Process().memory_info()
+    return {("rss",): memory_info.rss, ("vms",): memory_info.vms}
+
+
+registry.counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full",
+    callback=lambda: DroppingQueueHandler.dropped,
+)
+
+registry.gauge(
+    "process_memory_bytes",
+    "Memory of the bot process",
+    ["type"],
+    callback=_process_memory,
+)
+
+
+class MetricsServer:
+    """Minimal HTTP server answering GET /metrics with the registry in Prometheus format."""
+
+    def __init__(self, host: str, port: int, registry: Registry):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if self._server is not None:
+            return
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(
+            f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics"
+        )
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            # Skip request headers
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if (
+                len(parts) >= 2
+                and parts[0] == "GET"
+                and parts[1].split("?")[0]
+                in (
+                    "/metrics",
+                    "/",
+                )
+            ):
+                status = "200 OK"
+                body = self.registry.render().encode()
+            else:
+                status = "404 Not Found"
+                body = b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.warning(f"Error serving metrics request: {e}")
+        finally:
+            writer.close()
+
+
+metrics_server = MetricsServer(
+    app_settings.METRICS_HOST, app_settings.METRICS_PORT, registry
+)
@@ -0,0 +1,169 @@
+import asyncio
+import random
+import time
+from logging import getLogger
+from typing import Dict, Tuple
+
+from src.config import SCENARIO_PROMPTS, app_settings
+from src.dal.cache import LRUCache
+from src.llm_dispatcher import BACKGROUND, INTERACTIVE
+from src.usage_tracker import set_usage_user
+from src.utils import (
+    build_llm_messages,
+    clean_llm_response,
+    format_system_prompt,
+    request_completion,
+)
+
+logger = getLogger(__name__)
+
+# scenario, native language, target language, current level, goal category
+CohortKey = Tuple[str, str, str, str, str]
+
+# Learning goals are free text: cohorts use a few categories found by keywords
+GOAL_CATEGORIES = {
+    "travel": ("travel", "trip", "vacation", "holiday", "tourism"),
+    "work": ("work", "job", "career", "business", "interview"),
+    "exams and studies": ("exam", "test", "ielts", "toefl", "study", "university"),
+    "moving abroad": ("move", "moving", "relocat", "immigra", "emigra"),
+    "everyday conversation": ("speak", "talk", "conversation", "friends", "chat"),
+}
+DEFAULT_GOAL_CATEGORY = "general language learning"
+
+
+class OpenerCache:
+    """
+    Cache of scenario opener responses shared by users of the same cohort
+    (scenario and the profile fields used by the system prompt, the learning goal
+    reduced to a category). A cold miss generates the one opener it serves; later
+    hits add one variant at a time in the background up to `variants`, or replace
+    the pool when it is older than ttl_seconds. So the cache never makes more LLM
+    calls than uncached openers would. Cached openers do not see the user's
+    conversation history.
+    """
+
+    def __init__(self, variants: int, ttl_seconds: float, max_cohorts: int):
+        self.variants = variants
+        self.ttl_seconds = ttl_seconds
+        # Cohort key -> (variants, time the pool was filled)
+        self._pools = LRUCache(max_cohorts, ttl_seconds)
+        # Cold misses being generated, awaited by concurrent users of the cohort
+        self._generating: Dict[CohortKey, asyncio.Future] = {}
+        self._refreshing = set()
+        self._tasks = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_opener(self, scenario: str, user_data: dict) -> str:
+        """Returns an opener for the scenario, generating it only on a cold cache."""
+        if not SCENARIO_PROMPTS[scenario]:
+            return ""
+
+        key = self._cohort_key(scenario, user_data)
+        variants, filled_at = self._pools.get(key, ([], 0.0))
+        if variants:
+            self.hits += 1
+            if time.monotonic() - filled_at > self.ttl_seconds:
+                self._refresh_in_background(key, replace=True)
+            elif len(variants) < self.variants:
+                self._refresh_in_background(key, replace=False)
+            return random.choice(variants)
+
+        self.misses += 1
+        generating = self._generating.get(key)
+        if generating is None:
+            generating = asyncio.ensure_future(self._generate_first(key))
+            self._generating[key] = generating
+            generating.add_done_callback(lambda _: self._generating.pop(key, None))
+        # Shielded, so that a cancelled caller does not cancel it for the others
+        return await asyncio.shield(generating)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns number of cohorts and hit/miss counters."""
+        return {
+            "cohorts": self._pools.stats()["size"],
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshing": len(self._refreshing),
+        }
+
+    @staticmethod
+    def _cohort_key(scenario: str, user_data: dict) -> CohortKey:
+        return (
+            scenario,
+            (user_data.get("native_language") or "").strip().lower(),
+            (user_data.get("target_language") or "").strip().lower(),
+            (user_data.get("current_level") or "").strip().lower(),
+            OpenerCache._goal_category(user_data.get("learning_goal") or ""),
+        )
+
+    @staticmethod
+    def _goal_category(learning_goal: str) -> str:
+        learning_goal = learning_goal.lower()
+        for category, keywords in GOAL_CATEGORIES.items():
+            if any(keyword in learning_goal for keyword in keywords):
+                return category
+        return DEFAULT_GOAL_CATEGORY
+
+    async def _generate_first(self, key: CohortKey) -> str:
+        """Generates the opener of a cold cohort and seeds its pool with it."""
+        # Shared by the cohort, not accounted to the user who got the cold miss
+        set_usage_user(0)
+        opener = await self._generate(key)
+        self._pools.set(key, ([opener], time.monotonic()))
+        return opener
+
+    async def _generate(self, key: CohortKey, priority: int = INTERACTIVE) -> str:
+        """Generates one opener for the cohort. Errors are raised to the caller."""
+        scenario, native_language, target_language, current_level, goal_category = key
+        system_prompt = format_system_prompt(
+            app_settings.SYSTEM_PROMPT,
+            {
+                "native_language": native_language,
+                "target_language": target_language,
+                "current_level": current_level,
+                "learning_goal": goal_category,
+            },
+        )
+        output = await request_completion(
+            build_llm_messages(SCENARIO_PROMPTS[scenario], system_prompt),
+            priority=priority,
+        )
+        output = clean_llm_response(output or "").strip()
+        if not output:
+            raise ValueError(f"LLM returned an empty opener for {key}")
+        return output
+
+    def _refresh_in_background(self, key: CohortKey, replace: bool):
+        """Starts a task generating one variant unless one is already running."""
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, replace))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, key: CohortKey, replace: bool):
+        """Generates one variant: it replaces a stale pool or is added to a short one."""
+        # Shared by the cohort, not accounted to the user who triggered the refresh
+        set_usage_user(0)
+        try:
+            opener = await self._generate(key, BACKGROUND)
+        except Exception as e:
+            logger.error(f"Failed to refresh opener variants for {key}: {e}")
+            return
+        finally:
+            self._refreshing.discard(key)
+        if replace:
+            self._pools.set(key, ([opener], time.monotonic()))
+        else:
+            pool, filled_at = self._pools.get(key, ([], time.monotonic()))
+            self._pools.set(key, ((pool + [opener])[: self.variants], filled_at))
+        logger.info(f"Refreshed opener variants for {key}")
+
+
+opener_cache = OpenerCache(
+    variants=app_settings.OPENER_CACHE_VARIANTS,
+    ttl_seconds=app_settings.OPENER_CACHE_TTL_SECONDS,
+    max_cohorts=app_settings.OPENER_CACHE_MAX_COHORTS,
+)
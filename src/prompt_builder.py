@@ -0,0 +1,168 @@
+import datetime as dt
+import threading
+from logging import getLogger
+from typing import Dict, List, Tuple, Union
+
+from src.config import app_settings
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate by characters
+    tiktoken = None
+
+logger = getLogger(__name__)
+
+Message = Dict[str, Union[str, dt.datetime]]
+
+# Tokens added by the chat format around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+# Average number of characters per token when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+def _load_encoding():
+    """Loads tokenizer for the configured model, or None if tiktoken is not available."""
+    if tiktoken is None:
+        logger.warning("tiktoken is not installed, token counts are estimated")
+        return None
+    model_name = app_settings.LANGUAGE_MODEL.split("/")[-1]
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails e.g. without network
+        logger.warning(
+            f"Could not load tiktoken encoding, token counts are estimated: {e}"
+        )
+        return None
+
+
+_encoding = _load_encoding()
+
+
+def count_tokens(text: str) -> int:
+    """Counts tokens in the text locally."""
+    if not text:
+        return 0
+    if _encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(_encoding.encode(text))
+
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Counts tokens of chat messages sent to LLM."""
+    tokens = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            # Content given as parts, e.g. with cache_control breakpoints
+            content = "".join(part.get("text", "") for part in content)
+        tokens += count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    return tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts the text down to max_tokens tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN].rstrip() + "…"
+    return _encoding.decode(_encoding.encode(text)[:max_tokens]).rstrip() + "…"
+
+
+def fit_history_to_budget(
+    messages: List[Message], summary: str, budget: int
+) -> Tuple[List[Message], str]:
+    """
+    Fits the summary and the latest messages into the token budget.
+    The summary is kept (truncated if it alone exceeds the budget), then messages
+    are added from the newest to the oldest. The first message that does not fit
+    is shortened if enough budget is left, older messages are dropped.
+    """
+    summary_tokens = count_tokens(summary)
+    if summary_tokens > budget // 2:
+        summary = truncate_to_tokens(summary, budget // 2)
+        summary_tokens = count_tokens(summary)
+
+    remaining = budget - summary_tokens
+    kept = []
+    for message in reversed(messages):
+        tokens = count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if tokens <= remaining:
+            kept.append(message)
+            remaining -= tokens
+            continue
+
+        if remaining - MESSAGE_OVERHEAD_TOKENS >= app_settings.PROMPT_MIN_TURN_TOKENS:
+            kept.append(
+                {
+                    **message,
+                    "content": truncate_to_tokens(
+                        message["content"], remaining - MESSAGE_OVERHEAD_TOKENS
+                    ),
+                }
+            )
+        break
+
+    if len(kept) < len(messages):
+        logger.info(
+            f"Prompt budget of {budget} tokens: kept {len(kept)} of "
+            f"{len(messages)} messages"
+        )
+    kept.reverse()
+    return kept, summary
+
+
+class PromptTokenStats:
+    """Estimated vs actual prompt tokens and prompt cache hits reported by LLM provider."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.estimated_tokens = 0
+        self.actual_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+
+    def record(self, estimated: int, actual: int, cached: int = 0):
+        """Records one LLM call."""
+        with self._lock:
+            self.calls += 1
+            self.estimated_tokens += estimated
+            self.actual_tokens += actual
+            self.cached_tokens += cached
+            if cached:
+                self.cache_hits += 1
+        logger.info(
+            f"Prompt tokens: estimated {estimated}, actual {actual} "
+            f"(error {actual - estimated:+d}), cached {cached}"
+        )
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Returns totals and average prompt size."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "estimated_tokens": self.estimated_tokens,
+                "actual_tokens": self.actual_tokens,
+                "avg_actual_tokens": (
+                    round(self.actual_tokens / self.calls, 1) if self.calls else 0.0
+                ),
+                "cached_tokens": self.cached_tokens,
+                "cache_hit_calls": self.cache_hits,
+                "cached_tokens_ratio": (
+                    round(self.cached_tokens / self.actual_tokens, 3)
+                    if self.actual_tokens
+                    else 0.0
+                ),
+                "estimate_ratio": (
+                    round(self.estimated_tokens / self.actual_tokens, 3)
+                    if self.actual_tokens
+                    else 0.0
+                ),
+            }
+
+
+prompt_token_stats = PromptTokenStats()
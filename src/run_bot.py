@@ -11,11 +11,28 @@ from telegram.ext import (
     CallbackContext,
     ContextTypes,
     ApplicationBuilder,
+    TypeHandler,
 )
 
 from src.config import app_settings, SCENARIO_PROMPTS
-from src.dal import MessagesRepository, UsersRepository
-from src.utils import load_history_and_generate_answer, transcribe_audio
+from src.dal import AsyncMessagesRepository, AsyncUsersRepository
+from src.database import init_async_db_pool, close_async_db_pool
+from src.dal.message_writer import message_writer
+from src.llm_client import init_llm_client, close_llm_client
+from src.utils import (
+    load_history_and_generate_answer,
+    load_history_and_stream_answer,
+    transcribe_audio,
+)
+from src.streaming import reply_streaming
+from src.opener_cache import opener_cache
+from src.telegram_sender import telegram_sender
+from src.message_coalescer import message_coalescer
+from src.usage_tracker import flush_usage, pop_last_usage, reset_usage_context
+from src.metrics import HANDLER_DURATION, metrics_server, observe_handler_time
+from src.tracing import set_trace_attributes, start_trace
+from src.memory_governor import memory_governor
+from src.logging_config import log_payload
 from src.voice_handler import VoiceHandler
 from src.scheduler import LearningScheduler
 from src.admin_handlers import (
@@ -23,8 +40,16 @@ from src.admin_handlers import (
     send_today_logs,
     send_all_logs,
     trigger_morning_scenario,
+    cache_stats,
+    prompt_stats,
+    send_stats,
+    llm_stats,
+    usage_report,
+    slow_traces,
+    memory_report,
 )
 
+import asyncio
 import os
 import psutil
 import time
@@ -51,20 +76,15 @@ ASK_SCENARIO = 4
 EXECUTE_SCENARIO = 5
 
 
+@observe_handler_time
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the conversation and ask user for their native language."""
-    user = update.message.from_user
-    tg_id = user.id
-
     # Save user info if not exists
     # UsersRepository.create_user(tg_id, user.username, user.first_name, user.last_name)
 
-    # Schedule daily practice sessions for this user
-    scheduler.schedule_daily_sessions(tg_id)
-    logger.info(f"Scheduled daily practice sessions for user {tg_id}")
-
     reply_keyboard = [["English", "Turkish", "Spanish"]]
-    await update.message.reply_text(
+    await telegram_sender.reply_text(
+        update.message,
         "Hi! I'm your language learning assistant. " "What is your native language?",
         reply_markup=ReplyKeyboardMarkup(
             reply_keyboard,
@@ -76,31 +96,39 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return ASK_NATIVE_LANGUAGE
 
 
+@observe_handler_time
 async def ask_native_language(update: Update, context: CallbackContext) -> int:
     user_response = update.message.text.strip()
     context.user_data["native_language"] = user_response
-    await update.message.reply_text("Great! What language do you want to learn?")
+    await telegram_sender.reply_text(
+        update.message, "Great! What language do you want to learn?"
+    )
     return ASK_TARGET_LANGUAGE
 
 
+@observe_handler_time
 async def ask_target_language(update: Update, context: CallbackContext) -> int:
     user_response = update.message.text.strip()
     context.user_data["target_language"] = user_response
-    await update.message.reply_text(
-        "What is your current level? (Beginner, Intermediate, Advanced, Fluent)"
+    await telegram_sender.reply_text(
+        update.message,
+        "What is your current level? (Beginner, Intermediate, Advanced, Fluent)",
     )
     return ASK_CURRENT_LEVEL
 
 
+@observe_handler_time
 async def ask_current_level(update: Update, context: CallbackContext) -> int:
     user_response = update.message.text.strip()
     context.user_data["current_level"] = user_response
-    await update.message.reply_text(
-        "What is your goal? (e.g., reason for learning, timeframe, time available each week)"
+    await telegram_sender.reply_text(
+        update.message,
+        "What is your goal? (e.g., reason for learning, timeframe, time available each week)",
     )
     return ASK_GOAL
 
 
+@observe_handler_time
 async def ask_goal(update: Update, context: CallbackContext) -> int:
     user_response = update.message.text.strip()
     context.user_data["learning_goal"] = user_response
@@ -112,11 +140,15 @@ async def ask_goal(update: Update, context: CallbackContext) -> int:
     name = (
         update.message.from_user.first_name
     )  # Use first name instead of text for clarity
-    UsersRepository.create_user(name, user_id, **context.user_data)
+    await AsyncUsersRepository.create_user(name, user_id, **context.user_data)
+    await context.application.scheduler.add_user_schedule(user_id)
 
-    await update.message.reply_text("Thanks! Your preferences have been saved.")
+    await telegram_sender.reply_text(
+        update.message, "Thanks! Your preferences have been saved."
+    )
 
-    await update.message.reply_text(
+    await telegram_sender.reply_text(
+        update.message,
         "Welcome to your language learning session! From where would you like to start today?",
         reply_markup=ReplyKeyboardMarkup(
             [list(SCENARIO_PROMPTS.keys())], one_time_keyboard=True
@@ -125,9 +157,9 @@ async def ask_goal(update: Update, context: CallbackContext) -> int:
     return ASK_SCENARIO
 
 
+@observe_handler_time
 async def ask_scenario(update: Update, context: CallbackContext) -> int:
     """Function to handle user's scenario choice"""
-    log_memory_usage()
     tg_id = update.message.from_user.id
     scenario = update.message.text
 
@@ -136,69 +168,175 @@ async def ask_scenario(update: Update, context: CallbackContext) -> int:
         scenario  # Store selected scenario in user data
     )
 
-    logger.info(f"Call LLM for the first prompt in the selected scenario")
-    llm_response = load_history_and_generate_answer(tg_id, SCENARIO_PROMPTS[scenario])
+    llm_response = None
+    if app_settings.OPENER_CACHE_ENABLED:
+        try:
+            user_data = await AsyncUsersRepository.get_user_by_id(tg_id)
+            if user_data:
+                llm_response = await opener_cache.get_opener(scenario, user_data)
+        except Exception as e:
+            logger.error(f"Error getting cached scenario opener: {e}", exc_info=True)
+
+    if llm_response is None:
+        logger.info(f"Call LLM for the first prompt in the selected scenario")
+        llm_response = await load_history_and_generate_answer(
+            tg_id, SCENARIO_PROMPTS[scenario]
+        )
 
     if llm_response:
-        await update.message.reply_text(llm_response)
+        await telegram_sender.reply_text(update.message, llm_response)
 
         logger.info(f"Saving user input and llm's response.")
-        MessagesRepository.save_message(
-            tg_id, f"[Scenario: {scenario}]" + llm_response, is_llm=True
+        await AsyncMessagesRepository.save_message(
+            tg_id,
+            f"[Scenario: {scenario}]" + llm_response,
+            is_llm=True,
+            usage=pop_last_usage(),
         )
 
     # Continue in the scenario
     return EXECUTE_SCENARIO
 
 
+@observe_handler_time
 async def handle_text_message(
     update: Update, context: CallbackContext, transcribed_text: str = None
 ):
     """Handle text messages or transcribed voice messages"""
     start_time = time.time()
-    log_memory_usage()
     tg_id = update.message.from_user.id
 
     # Use transcribed text if provided, otherwise use the text message
     message_text = transcribed_text or update.message.text
+    set_trace_attributes(user_id=tg_id)
 
-    logger.info(f"Processing message from user '{tg_id}': {message_text}")
+    logger.info(f"Processing message from user '{tg_id}'")
+    log_payload("user_message", message_text)
 
     try:
         # Save message to history
         current_scenario = get_current_scenario(context.user_data)
-        MessagesRepository.save_message(
+        await AsyncMessagesRepository.save_message(
             tg_id, f"[Scenario: {current_scenario}] {message_text}"
         )
 
-        # Generate response
-        response = load_history_and_generate_answer(tg_id, message_text)
-
-        # Save bot's response
-        MessagesRepository.save_message(tg_id, response, is_llm=True)
-
-        # Send response
-        await update.message.reply_text(response)
-
-        processing_time = time.time() - start_time
-        logger.info(f"Message processing took {processing_time:.2f} seconds")
-        log_memory_usage()
+        # Voice messages are answered right away: the voice handler speaks the reply
+        # it finds in history once this handler returns
+        if app_settings.MESSAGE_COALESCING and transcribed_text is None:
+            # Answered once together with messages sent right after this one
+            message_coalescer.submit(
+                tg_id,
+                message_text,
+                lambda text: answer_message(update, tg_id, text, start_time),
+            )
+            return
 
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
-        await update.message.reply_text(
-            "I'm having trouble processing your message right now. Please try again in a moment."
+        await telegram_sender.reply_text(
+            update.message,
+            "I'm having trouble processing your message right now. Please try again in a moment.",
         )
+        return
+
+    await answer_message(update, tg_id, message_text, start_time)
+
+
+async def answer_message(
+    update: Update, tg_id: int, message_text: str, start_time: float
+):
+    """Generate LLM response to the user's message, save it and send it to the user"""
+    # A trace of its own when answered by message_coalescer after the handler returned
+    with start_trace("answer_message", user_id=tg_id):
+        try:
+            if app_settings.STREAMING_REPLIES:
+                # Send response while it is being generated
+                response = await reply_streaming(
+                    update.message, load_history_and_stream_answer(tg_id, message_text)
+                )
+
+                # Save bot's response
+                await AsyncMessagesRepository.save_message(
+                    tg_id, response, is_llm=True, usage=pop_last_usage()
+                )
+            else:
+                # Generate response
+                response = await load_history_and_generate_answer(tg_id, message_text)
+
+                # Save bot's response
+                await AsyncMessagesRepository.save_message(
+                    tg_id, response, is_llm=True, usage=pop_last_usage()
+                )
+
+                # Send response
+                await telegram_sender.reply_text(update.message, response)
+
+            processing_time = time.time() - start_time
+            HANDLER_DURATION.observe(processing_time, "reply")
+            logger.info(f"Message processing took {processing_time:.2f} seconds")
+
+        except Exception as e:
+            logger.error(f"Error processing message: {e}", exc_info=True)
+            await telegram_sender.reply_text(
+                update.message,
+                "I'm having trouble processing your message right now. Please try again in a moment.",
+            )
+
+
+async def reset_update_context(update: Update, context: CallbackContext) -> None:
+    """Runs before other handlers, so that nothing of the previous update leaks into this one"""
+    reset_usage_context()
 
 
 async def cancel(update: Update, context: CallbackContext) -> int:
     """Function to stop conversation"""
-    await update.message.reply_text(
-        "Goodbye! Feel free to come back anytime for more practice."
+    await telegram_sender.reply_text(
+        update.message, "Goodbye! Feel free to come back anytime for more practice."
     )
     return ConversationHandler.END
 
 
+async def post_init(application: Application) -> None:
+    """Creates shared clients on the bot's event loop once it is running."""
+    init_llm_client()
+    await init_async_db_pool()
+    if app_settings.MESSAGE_WRITE_BEHIND:
+        message_writer.start()
+    telegram_sender.start()
+    if app_settings.METRICS_ENABLED:
+        await metrics_server.start()
+    # Rebuild practice sessions from DB, scheduled jobs run on this loop
+    await application.scheduler.rehydrate()
+    application.scheduler.start()
+    logger.info("Learning scheduler started")
+    if app_settings.MEMORY_GOVERNOR_ENABLED:
+        # Everything allocated so far lives as long as the process
+        memory_governor.configure_gc()
+
+
+async def post_stop(application: Application) -> None:
+    """
+    Stops scheduled jobs and pending turns and sends queued messages. Runs before
+    Application.shutdown(), while the bot can still send.
+    """
+    # No new practice messages from here on
+    application.scheduler.stop()
+    logger.info("Learning scheduler stopped")
+    await message_coalescer.stop()
+    await telegram_sender.stop()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Closes shared clients and their connection pools."""
+    await close_llm_client()
+    if app_settings.USAGE_TRACKING:
+        await flush_usage()
+    await close_async_db_pool()
+    await metrics_server.stop()
+    # Drain queued messages before exit
+    await asyncio.to_thread(message_writer.stop)
+
+
 def get_current_scenario(user_data):
     if not user_data.get("current_scenario"):
         user_data["current_scenario"] = "General Conversation"
@@ -207,26 +345,51 @@ def get_current_scenario(user_data):
     return current_scenario
 
 
-if __name__ == "__main__":
-    log_memory_usage()
-    logger.info("~~~Send any message to a bot to start chatting~~~")
-
-    # Create the application and add the conversation handler
-    app = ApplicationBuilder().token(app_settings.TELEGRAM_BOT_TOKEN).build()
+def create_application(base_url: str = None) -> Application:
+    """
+    Builds the bot application with all handlers and the learning scheduler.
+    base_url overrides the Telegram Bot API URL (e.g. a local stand-in for load tests).
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(app_settings.TELEGRAM_BOT_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
 
     # Initialize and start the learning scheduler
     scheduler = LearningScheduler(app)
-    scheduler.start()
-    logger.info("Learning scheduler started")
-
-    # Make scheduler accessible to handlers
+    if app_settings.SUMMARY_ENABLED:
+        scheduler.schedule_summaries()
+    if app_settings.PREGENERATION_ENABLED:
+        scheduler.schedule_pregeneration()
+    if app_settings.USAGE_TRACKING:
+        scheduler.schedule_usage_flush()
+    if app_settings.MEMORY_GOVERNOR_ENABLED:
+        scheduler.schedule_memory_check()
+
+    # Make scheduler accessible to handlers (started in post_init)
     app.scheduler = scheduler
 
+    # Updates are handled one after another in the same task by default
+    app.add_handler(TypeHandler(Update, reset_update_context), group=-1)
+
     # Add admin command handlers
     app.add_handler(CommandHandler("health", health_check))
     app.add_handler(CommandHandler("send_logs", send_today_logs))
     app.add_handler(CommandHandler("send_all_logs", send_all_logs))
     app.add_handler(CommandHandler("trigger_morning", trigger_morning_scenario))
+    app.add_handler(CommandHandler("cache_stats", cache_stats))
+    app.add_handler(CommandHandler("prompt_stats", prompt_stats))
+    app.add_handler(CommandHandler("send_stats", send_stats))
+    app.add_handler(CommandHandler("llm_stats", llm_stats))
+    app.add_handler(CommandHandler("usage", usage_report))
+    app.add_handler(CommandHandler("slow_traces", slow_traces))
+    app.add_handler(CommandHandler("memory", memory_report))
 
     # Add conversation handler
     conversation_handler = ConversationHandler(
@@ -261,11 +424,14 @@ if __name__ == "__main__":
             filters.VOICE & ~filters.COMMAND, VoiceHandler().handle_voice_message
         )
     )
+    return app
+
+
+if __name__ == "__main__":
+    log_memory_usage()
+    logger.info("~~~Send any message to a bot to start chatting~~~")
+
+    app = create_application()
 
     logger.info("Starting bot...")
-    try:
-        app.run_polling()
-    finally:
-        # Ensure scheduler is stopped when app exits
-        scheduler.stop()
-        logger.info("Learning scheduler stopped")
+    app.run_polling()
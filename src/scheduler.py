@@ -1,26 +1,77 @@
 import os
 import asyncio
+import datetime as dt
+import random
+import time
 from logging import getLogger
+from typing import Any, Awaitable, Callable, List, Sequence
 
 import pytz
 import yaml
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from telegram.ext import Application
 
-from src.dal import MessagesRepository, UsersRepository
-from src.utils import load_history_and_generate_answer
+from src.dal import (
+    AsyncMessagesRepository,
+    AsyncPregeneratedRepository,
+    AsyncSchedulesRepository,
+    AsyncUsersRepository,
+)
+from src.config import app_settings
+from src.llm_dispatcher import BACKGROUND, SCHEDULED
+from src.memory_governor import memory_governor
+from src.metrics import SCHEDULER_SLOT_DURATION
+from src.summarizer import run_summaries
+from src.telegram_sender import BROADCAST, telegram_sender
+from src.usage_tracker import flush_usage, pop_last_usage
+from src.utils import (
+    build_llm_messages,
+    clean_llm_response,
+    load_history_and_update_system_prompt,
+    request_completion,
+)
 
 logger = getLogger(__name__)
 
+# Default daily practice sessions and their start hour (Europe/Istanbul)
+SESSION_SLOTS = {"morning": 9, "midday": 15, "evening": 22}
+
+
+async def run_workers(
+    items: Sequence, workers: int, handle: Callable[[Any], Awaitable[Any]]
+) -> List[Any]:
+    """
+    Handles items with a fixed number of workers draining a queue, so that a
+    large batch does not create a coroutine per item. Returns results in the
+    order of items.
+    """
+    queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        queue.put_nowait((index, item))
+    results = [None] * len(items)
+
+    async def worker():
+        while not queue.empty():
+            index, item = queue.get_nowait()
+            results[index] = await handle(item)
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(items)))))
+    return results
+
 
 class LearningScheduler:
     def __init__(self, app: Application):
-        self.scheduler = BackgroundScheduler()
+        # Runs jobs as coroutines on the bot's event loop: the bot, LLM client
+        # and DB pool are shared with handlers. Must be started from that loop.
+        self.scheduler = AsyncIOScheduler()
         self.app = app
         self.tz = pytz.timezone("Europe/Istanbul")
         self.prompts = {}
         self.load_prompts()
+        # Last run of every session slot: users, sent, failed, duration
+        self.slot_stats = {}
 
         # Add logging for scheduler events
         self.scheduler.add_listener(self._log_job_events)
@@ -34,83 +85,47 @@ class LearningScheduler:
         elif event.code == 8:  # EVENT_JOB_ERROR
             logger.error(f"Job failed: {event.job_id}, Error: {event.exception}")
 
-    async def send_practice_message(self, user_id: int, session_type: str):
-        """Send a practice message based on the time of day"""
+    async def send_practice_message(
+        self,
+        user_id: int,
+        session_type: str,
+        user_data: dict = None,
+        text: str = None,
+    ) -> bool:
+        """
+        Send a practice message based on the time of day. Returns True if sent.
+        The message is generated now unless a pre-generated text is given.
+        """
         try:
             logger.info(f"Attempting to send {session_type} message to user {user_id}")
 
-            # Get user data
-            user_data = UsersRepository.get_user_by_id(user_id)
+            # Get user data unless it was loaded by the caller
+            if user_data is None:
+                user_data = await AsyncUsersRepository.get_user_by_id(user_id)
             if not user_data:
                 logger.warning(f"User {user_id} not found in database")
-                return
+                return False
 
             native_lang = user_data.get("native_language", "Russian").lower()
-            base_prompt = (
-                f"You are Leyla, a warm and supportive Turkish language tutor. "
-                f"The student's native language is {native_lang}, so ALWAYS respond in {native_lang} with Turkish examples. "
-                f"The student is at A1 level. "
-                f"ALWAYS check any Turkish sentences they write for grammar mistakes. "
-                f"If you find mistakes: "
-                f"1. Point out the error "
-                f"2. Explain the correct form "
-                f"3. Suggest how natives would naturally express this idea "
-                f"4. Give 2-3 alternative ways to say the same thing\n\n"
-            )
-
-            # Select appropriate prompt based on session type
-            if session_type == "morning":
-                prompt = base_prompt + (
-                    "Start a morning conversation about daily routines and plans. "
-                    "Keep the tone feminine, graceful, and full of positive energy. "
-                    "Ask about their morning routine or plans for the day. "
-                    "Include simple A1 level Turkish phrases with translations."
-                )
-            elif session_type == "midday":
-                prompt = base_prompt + (
-                    "Start a midday conversation about food, cooking, shopping, or daily activities. "
-                    "Keep the tone practical and engaging. "
-                    "Ask about their lunch, shopping plans, or current activities. "
-                    "Include simple A1 level Turkish phrases with translations."
-                )
-            else:  # evening
-                prompt = base_prompt + (
-                    "Start an evening conversation reviewing the day. "
-                    "Keep the tone soulful and warm. "
-                    "Ask about their day or evening plans. "
-                    "Include simple A1 level Turkish phrases with translations."
-                )
-
-            # Generate response using LLM
-            response = load_history_and_generate_answer(user_id, "", prompt)
-            logger.info(f"Generated response for user {user_id}")
+            response = text or await self.generate_practice_message(
+                user_id, session_type, native_lang
+            )
 
             # Validate response
             if not response or not response.strip():
-                logger.error("LLM generated an empty response")
-                # Use fallback message based on session type and native language
-                if native_lang == "russian":
-                    fallback_messages = {
-                        "morning": "Доброе утро! 🌞 Давайте попрактикуем турецкий. Как вы спали? По-турецки это: Nasıl uyudun?",
-                        "midday": "Здравствуйте! 🌤️ Время практики турецкого. Вы уже обедали? По-турецки это: Öğle yemeği yedin mi?",
-                        "evening": "Добрый вечер! 🌙 Давайте обсудим ваш день. Как прошёл день? По-турецки это: Günün nasıl geçti?",
-                    }
-                else:
-                    fallback_messages = {
-                        "morning": "Good morning! 🌞 Let's practice Turkish. How did you sleep? In Turkish: Nasıl uyudun?",
-                        "midday": "Hello! 🌤️ Time for Turkish practice. Have you had lunch? In Turkish: Öğle yemeği yedin mi?",
-                        "evening": "Good evening! 🌙 Let's review your day. How was your day? In Turkish: Günün nasıl geçti?",
-                    }
-                response = fallback_messages.get(
-                    session_type, "Merhaba! Let's practice Turkish!"
-                )
+                logger.error("No practice message for user, using fallback message")
+                response = self.fallback_message(session_type, native_lang)
 
             # Save bot's message
-            MessagesRepository.save_message(user_id, response, is_llm=True)
+            await AsyncMessagesRepository.save_message(
+                user_id, response, is_llm=True, usage=pop_last_usage()
+            )
 
-            # Send message - using the bot instance directly from app
-            await self.app.bot.send_message(
+            # Send message through the rate limited send layer
+            await telegram_sender.send_message(
+                self.app.bot,
                 chat_id=user_id,
+                priority=BROADCAST,
                 text=response,
                 parse_mode=None,  # Don't use markdown to avoid formatting issues
             )
@@ -118,64 +133,343 @@ class LearningScheduler:
             logger.info(
                 f"Successfully sent {session_type} practice message to user {user_id}"
             )
+            return True
 
         except Exception as e:
             logger.error(f"Error sending practice message: {e}", exc_info=True)
+            return False
 
-    def _run_coroutine(self, coroutine):
-        """Helper function to run coroutines in the scheduler"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    async def generate_practice_message(
+        self,
+        user_id: int,
+        session_type: str,
+        native_lang: str,
+        priority: int = SCHEDULED,
+    ) -> str:
+        """Generate a practice message with LLM. Returns empty string on failure."""
         try:
-            return loop.run_until_complete(coroutine)
-        finally:
-            loop.close()
+            system_prompt, context = await load_history_and_update_system_prompt(
+                user_id
+            )
+            output = await request_completion(
+                build_llm_messages(
+                    "",
+                    system_prompt,
+                    self.practice_prompt(session_type, native_lang),
+                    context,
+                ),
+                priority=priority,
+            )
+            logger.info(f"Generated {session_type} message for user {user_id}")
+            return clean_llm_response(output or "").strip()
+        except Exception as e:
+            logger.error(
+                f"Error generating {session_type} message for user {user_id}: {e}",
+                exc_info=True,
+            )
+            return ""
+
+    @staticmethod
+    def practice_prompt(session_type: str, native_lang: str) -> str:
+        """Build the LLM prompt of a practice session"""
+        base_prompt = (
+            f"You are Leyla, a warm and supportive Turkish language tutor. "
+            f"The student's native language is {native_lang}, so ALWAYS respond in {native_lang} with Turkish examples. "
+            f"The student is at A1 level. "
+            f"ALWAYS check any Turkish sentences they write for grammar mistakes. "
+            f"If you find mistakes: "
+            f"1. Point out the error "
+            f"2. Explain the correct form "
+            f"3. Suggest how natives would naturally express this idea "
+            f"4. Give 2-3 alternative ways to say the same thing\n\n"
+        )
 
-    def schedule_daily_sessions(self, user_id: int):
-        """Schedule daily practice sessions for a user"""
+        # Select appropriate prompt based on session type
+        if session_type == "morning":
+            prompt = base_prompt + (
+                "Start a morning conversation about daily routines and plans. "
+                "Keep the tone feminine, graceful, and full of positive energy. "
+                "Ask about their morning routine or plans for the day. "
+                "Include simple A1 level Turkish phrases with translations."
+            )
+        elif session_type == "midday":
+            prompt = base_prompt + (
+                "Start a midday conversation about food, cooking, shopping, or daily activities. "
+                "Keep the tone practical and engaging. "
+                "Ask about their lunch, shopping plans, or current activities. "
+                "Include simple A1 level Turkish phrases with translations."
+            )
+        else:  # evening
+            prompt = base_prompt + (
+                "Start an evening conversation reviewing the day. "
+                "Keep the tone soulful and warm. "
+                "Ask about their day or evening plans. "
+                "Include simple A1 level Turkish phrases with translations."
+            )
+        return prompt
+
+    @staticmethod
+    def fallback_message(session_type: str, native_lang: str) -> str:
+        """Static practice message used when no generated message is available"""
+        # Use fallback message based on session type and native language
+        if native_lang == "russian":
+            fallback_messages = {
+                "morning": "Доброе утро! 🌞 Давайте попрактикуем турецкий. Как вы спали? По-турецки это: Nasıl uyudun?",
+                "midday": "Здравствуйте! 🌤️ Время практики турецкого. Вы уже обедали? По-турецки это: Öğle yemeği yedin mi?",
+                "evening": "Добрый вечер! 🌙 Давайте обсудим ваш день. Как прошёл день? По-турецки это: Günün nasıl geçti?",
+            }
+        else:
+            fallback_messages = {
+                "morning": "Good morning! 🌞 Let's practice Turkish. How did you sleep? In Turkish: Nasıl uyudun?",
+                "midday": "Hello! 🌤️ Time for Turkish practice. Have you had lunch? In Turkish: Öğle yemeği yedin mi?",
+                "evening": "Good evening! 🌙 Let's review your day. How was your day? In Turkish: Günün nasıl geçti?",
+            }
+        return fallback_messages.get(session_type, "Merhaba! Let's practice Turkish!")
+
+    async def rehydrate(self) -> dict:
+        """
+        Rebuild practice session jobs from practice_schedules.
+        Users without a schedule get the default one in a single statement, then
+        one job is registered per distinct slot found in the table.
+        """
+        start_time = time.monotonic()
+        backfilled = 0
+        slots = {}
         try:
-            logger.info(f"Scheduling daily sessions for user {user_id}")
+            backfilled = await AsyncSchedulesRepository.backfill_default_schedules(
+                SESSION_SLOTS, self.tz.zone
+            )
+            slots = dict(await AsyncSchedulesRepository.get_slots())
+        except Exception as e:
+            logger.error(f"Error loading practice schedules: {e}", exc_info=True)
+
+        # Default slots always exist so that new users are picked up
+        for session_type, hour in SESSION_SLOTS.items():
+            slots.setdefault((session_type, hour, 0, self.tz.zone), 0)
 
-            # Morning session (9-10 GMT+3)
+        for slot in slots:
+            self.schedule_session_slot(*slot)
+
+        stats = {
+            "schedules": sum(slots.values()),
+            "backfilled": backfilled,
+            "slots": len(slots),
+            "duration_seconds": round(time.monotonic() - start_time, 2),
+        }
+        logger.info(f"Rehydrated practice schedules: {stats}")
+        return stats
+
+    async def add_user_schedule(self, user_id: int):
+        """Create default practice schedule for a new user"""
+        await AsyncSchedulesRepository.create_default_schedules(
+            user_id, SESSION_SLOTS, self.tz.zone
+        )
+        logger.info(f"Created default practice schedule for user {user_id}")
+
+    def schedule_session_slot(
+        self, session_type: str, hour: int, minute: int, timezone: str
+    ):
+        """Schedule the fan-out job of one practice session slot"""
+        job_id = f"{session_type}_{hour:02d}{minute:02d}_{timezone}"
+        self.scheduler.add_job(
+            self.run_session_slot,
+            CronTrigger(hour=hour, minute=minute, timezone=timezone),
+            args=[session_type, hour, minute, timezone],
+            id=job_id,
+            replace_existing=True,
+            misfire_grace_time=300,
+            max_instances=1,
+            coalesce=True,
+        )
+        logger.info(f"Scheduled job {job_id}")
+
+    async def run_session_slot(
+        self, session_type: str, hour: int, minute: int, timezone: str
+    ) -> dict:
+        """
+        Send practice messages of the session to all users scheduled for the slot.
+        Users are loaded with one query, each gets a random delivery time within
+        the jitter window, and a fixed pool of workers sends in that order.
+        """
+        start_time = time.monotonic()
+        users = await AsyncSchedulesRepository.get_slot_users(
+            session_type, hour, minute, timezone
+        )
+        pregenerated = None
+        if app_settings.PREGENERATION_ENABLED:
+            try:
+                pregenerated = await AsyncPregeneratedRepository.take_messages(
+                    session_type, [user["telegram_user_id"] for user in users]
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error loading pre-generated messages: {e}", exc_info=True
+                )
+                pregenerated = {}
+        deliveries = sorted(
+            (
+                (random.uniform(0, app_settings.SCHEDULER_FANOUT_JITTER_SECONDS), user)
+                for user in users
+            ),
+            key=lambda delivery: delivery[0],
+        )
+
+        async def deliver(delivery: tuple) -> bool:
+            delay, user_data = delivery
+            user_id = user_data["telegram_user_id"]
+            text = None
+            if pregenerated is not None:
+                # Only send at delivery time, missed users get the static message
+                text = pregenerated.get(user_id) or self.fallback_message(
+                    session_type,
+                    (user_data.get("native_language") or "Russian").lower(),
+                )
+            wait = start_time + delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return await self.send_practice_message(
+                user_id, session_type, user_data, text
+            )
+
+        results = await run_workers(
+            deliveries, app_settings.SCHEDULER_FANOUT_CONCURRENCY, deliver
+        )
+
+        stats = {
+            "users": len(users),
+            "pregenerated": len(pregenerated) if pregenerated is not None else None,
+            "sent": sum(1 for result in results if result),
+            "failed": sum(1 for result in results if not result),
+            "duration_seconds": round(time.monotonic() - start_time, 2),
+        }
+        self.slot_stats[f"{session_type}_{hour:02d}{minute:02d}_{timezone}"] = stats
+        SCHEDULER_SLOT_DURATION.observe(time.monotonic() - start_time, session_type)
+        logger.info(f"Finished {session_type} slot ({hour:02d}:{minute:02d}): {stats}")
+        return stats
+
+    def schedule_pregeneration(self):
+        """Schedule the daily off-peak pre-generation of practice messages"""
+        try:
             self.scheduler.add_job(
-                self._run_coroutine,
-                CronTrigger(hour=9, minute="0-59/15", timezone=self.tz),
-                args=[self.send_practice_message(user_id, "morning")],
-                id=f"morning_session_{user_id}",
+                self.run_pregeneration,
+                CronTrigger(
+                    hour=app_settings.PREGENERATION_HOUR, minute=0, timezone=self.tz
+                ),
+                id="practice_pregeneration",
                 replace_existing=True,
-                misfire_grace_time=300,
+                misfire_grace_time=3600,
+                max_instances=1,
+                coalesce=True,
             )
+            logger.info(
+                f"Scheduled pre-generation at {app_settings.PREGENERATION_HOUR}:00 {self.tz}"
+            )
+        except Exception as e:
+            logger.error(f"Error scheduling pre-generation: {e}", exc_info=True)
+
+    async def run_pregeneration(self) -> dict:
+        """
+        Generate practice messages of all scheduled sessions ahead of delivery.
+        Runs as a low-priority batch with a small pool of workers making LLM calls.
+        """
+        start_time = time.monotonic()
+        ttl = dt.timedelta(hours=app_settings.PREGENERATION_TTL_HOURS)
+
+        async def pregenerate(job: tuple) -> bool:
+            user_data, session_type = job
+            user_id = user_data["telegram_user_id"]
+            native_lang = (user_data.get("native_language") or "Russian").lower()
+            try:
+                text = await self.generate_practice_message(
+                    user_id, session_type, native_lang, BACKGROUND
+                )
+                if not text:
+                    logger.warning(
+                        f"No {session_type} practice message pre-generated for user {user_id}"
+                    )
+                    return False
+                await AsyncPregeneratedRepository.save_message(
+                    user_id, session_type, text, ttl
+                )
+                return True
+            except Exception as e:
+                logger.error(
+                    f"Error pre-generating {session_type} practice message "
+                    f"for user {user_id}: {e}",
+                    exc_info=True,
+                )
+                return False
+
+        await AsyncPregeneratedRepository.delete_expired()
+        jobs = []
+        for slot, _ in await AsyncSchedulesRepository.get_slots():
+            session_type = slot[0]
+            for user_data in await AsyncSchedulesRepository.get_slot_users(*slot):
+                jobs.append((user_data, session_type))
 
-            # Afternoon session (15-16 GMT+3)
+        results = await run_workers(
+            jobs, app_settings.PREGENERATION_CONCURRENCY, pregenerate
+        )
+        stats = {
+            "messages": len(results),
+            "generated": sum(1 for result in results if result),
+            "failed": sum(1 for result in results if not result),
+            "duration_seconds": round(time.monotonic() - start_time, 2),
+        }
+        logger.info(f"Finished pre-generation of practice messages: {stats}")
+        return stats
+
+    def schedule_summaries(self):
+        """Schedule the background job that updates rolling conversation summaries"""
+        try:
             self.scheduler.add_job(
-                self._run_coroutine,
-                CronTrigger(hour=15, minute="0-59/15", timezone=self.tz),
-                args=[self.send_practice_message(user_id, "midday")],
-                id=f"midday_session_{user_id}",
+                run_summaries,
+                IntervalTrigger(minutes=app_settings.SUMMARY_INTERVAL_MINUTES),
+                id="conversation_summaries",
                 replace_existing=True,
-                misfire_grace_time=300,
+                max_instances=1,
+                coalesce=True,
+            )
+            logger.info(
+                f"Scheduled conversation summaries every "
+                f"{app_settings.SUMMARY_INTERVAL_MINUTES} minutes"
             )
+        except Exception as e:
+            logger.error(f"Error scheduling summaries: {e}", exc_info=True)
 
-            # Evening session (22-23 GMT+3)
+    def schedule_usage_flush(self):
+        """Schedule the job that writes accumulated LLM usage to the daily rollups"""
+        try:
             self.scheduler.add_job(
-                self._run_coroutine,
-                CronTrigger(hour=22, minute="0-59/15", timezone=self.tz),
-                args=[self.send_practice_message(user_id, "evening")],
-                id=f"evening_session_{user_id}",
+                flush_usage,
+                IntervalTrigger(seconds=app_settings.USAGE_FLUSH_INTERVAL),
+                id="usage_flush",
                 replace_existing=True,
-                misfire_grace_time=300,
+                max_instances=1,
+                coalesce=True,
             )
+            logger.info(
+                f"Scheduled usage flush every {app_settings.USAGE_FLUSH_INTERVAL} seconds"
+            )
+        except Exception as e:
+            logger.error(f"Error scheduling usage flush: {e}", exc_info=True)
 
-            logger.info(f"Successfully scheduled all sessions for user {user_id}")
-            # Print all jobs for this user
-            jobs = self.scheduler.get_jobs()
-            for job in jobs:
-                logger.info(
-                    f"Scheduled job: {job.id} - Next run time: {job.next_run_time}"
-                )
-
+    def schedule_memory_check(self):
+        """Schedule the job that collects garbage when RSS crosses the memory watermarks"""
+        try:
+            self.scheduler.add_job(
+                memory_governor.check,
+                IntervalTrigger(seconds=app_settings.MEMORY_CHECK_INTERVAL),
+                id="memory_check",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
+            logger.info(
+                f"Scheduled memory check every {app_settings.MEMORY_CHECK_INTERVAL} seconds"
+            )
         except Exception as e:
-            logger.error(f"Error scheduling sessions: {e}", exc_info=True)
+            logger.error(f"Error scheduling memory check: {e}", exc_info=True)
 
     def load_prompts(self):
         """Load conversation prompts from YAML file"""
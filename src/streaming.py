@@ -0,0 +1,72 @@
+import re
+import time
+from logging import getLogger
+from typing import AsyncIterator
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from src.config import app_settings
+from src.telegram_sender import telegram_sender
+from src.utils import clean_llm_response
+
+logger = getLogger(__name__)
+
+# End of the first sentence: punctuation followed by whitespace, or a line break
+FIRST_SENTENCE_END = re.compile(r"[.!?…](\s|$)|\n")
+
+
+async def reply_streaming(message: Message, chunks: AsyncIterator[str]) -> str:
+    """
+    Replies to the message with text that is being generated.
+    Sends the first message as soon as the first sentence is ready, then edits it
+    not more often than STREAM_EDIT_INTERVAL seconds until the stream is over.
+    Returns the final cleaned text.
+    """
+    text = ""
+    sent_message = None
+    sent_text = ""
+    last_edit_time = 0.0
+
+    async for delta in chunks:
+        text += delta
+        cleaned = clean_llm_response(text).strip()
+        if not cleaned:
+            continue
+
+        if sent_message is None:
+            if (
+                FIRST_SENTENCE_END.search(cleaned)
+                or len(cleaned) >= app_settings.STREAM_FIRST_MESSAGE_MAX_CHARS
+            ):
+                sent_message = await telegram_sender.reply_text(message, cleaned)
+                sent_text = cleaned
+                last_edit_time = time.monotonic()
+        elif (
+            time.monotonic() - last_edit_time >= app_settings.STREAM_EDIT_INTERVAL
+            and cleaned != sent_text
+        ):
+            await _edit_message(sent_message, cleaned)
+            sent_text = cleaned
+            last_edit_time = time.monotonic()
+
+    final_text = clean_llm_response(text).strip()
+    if not final_text:
+        return ""
+
+    if sent_message is None:
+        await telegram_sender.reply_text(message, final_text)
+    elif final_text != sent_text:
+        await _edit_message(sent_message, final_text)
+
+    return final_text
+
+
+async def _edit_message(message: Message, text: str):
+    """Edits already sent message, ignoring 'message is not modified' errors."""
+    try:
+        await telegram_sender.edit_text(message, text)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+        logger.debug(f"Message {message.message_id} is not modified, skipping edit")
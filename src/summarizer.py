@@ -0,0 +1,87 @@
+import time
+from logging import getLogger
+
+from src.config import app_settings
+from src.dal import AsyncSummariesRepository, MessagesRepository
+from src.llm_dispatcher import BACKGROUND
+from src.usage_tracker import set_usage_user
+from src.utils import request_completion
+
+logger = getLogger(__name__)
+
+SUMMARY_PROMPT = app_settings.SYSTEM_PROMPTS["summary"]["rolling_summary"]
+
+
+async def summarize_user(telegram_user_id: int) -> bool:
+    """
+    Folds messages added since the last run into user's rolling summary.
+    Returns True if the summary was updated.
+    """
+    set_usage_user(telegram_user_id)
+    summary, last_message_id = await AsyncSummariesRepository.get_summary_state(
+        telegram_user_id
+    )
+    messages = await AsyncSummariesRepository.get_messages_to_summarize(
+        telegram_user_id,
+        after_id=last_message_id,
+        keep_last=app_settings.SUMMARY_KEEP_LAST_TURNS,
+        limit=app_settings.SUMMARY_MAX_MESSAGES_PER_RUN,
+    )
+    if not messages:
+        return False
+
+    system_prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(empty)",
+        # Roughly 0.75 words per token
+        max_words=int(app_settings.SUMMARY_MAX_TOKENS * 0.75),
+    )
+    new_summary = await request_completion(
+        [
+            {"role": "system", "content": system_prompt},
+            {
+                "role": "user",
+                "content": MessagesRepository.join_messages_to_string(messages),
+            },
+        ],
+        temperature=0.2,
+        max_tokens=app_settings.SUMMARY_MAX_TOKENS,
+        priority=BACKGROUND,
+    )
+    if not new_summary or not new_summary.strip():
+        logger.warning(f"LLM returned an empty summary for user {telegram_user_id}")
+        return False
+
+    await AsyncSummariesRepository.save_summary(
+        telegram_user_id, new_summary.strip(), messages[-1]["id"]
+    )
+    logger.info(
+        f"Folded {len(messages)} messages into summary of user {telegram_user_id}"
+    )
+    return True
+
+
+async def run_summaries() -> int:
+    """Background job: updates summaries of users with enough new messages."""
+    start_time = time.time()
+    user_ids = await AsyncSummariesRepository.get_users_to_summarize(
+        min_messages=app_settings.SUMMARY_KEEP_LAST_TURNS
+        + app_settings.SUMMARY_MIN_NEW_MESSAGES,
+        limit=app_settings.SUMMARY_USERS_PER_RUN,
+    )
+
+    updated = 0
+    for user_id in user_ids:
+        try:
+            if await summarize_user(user_id):
+                updated += 1
+        except Exception as e:
+            logger.error(
+                f"Error summarizing conversation of user {user_id}: {e}", exc_info=True
+            )
+
+    processing_time = time.time() - start_time
+    logger.info(
+        f"Updated {updated}/{len(user_ids)} conversation summaries "
+        f"in {processing_time:.2f}s"
+    )
+    return updated
@@ -0,0 +1,332 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telegram import Bot, Message
+from telegram.error import RetryAfter
+
+from src.config import app_settings
+from src.metrics import TELEGRAM_SEND_DURATION, registry
+from src.tracing import span
+
+logger = getLogger(__name__)
+
+# Priority lanes: lower value is sent first
+INTERACTIVE = 0
+BROADCAST = 1
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token. Returns 0 on success or seconds to wait until one is available."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class TelegramSender:
+    """
+    Outbound layer for Telegram API calls.
+    Calls are queued by priority and executed by a pool of workers that respect
+    a global token bucket and a bucket per chat. A call whose chat has no token
+    is put back in the queue when the chat's bucket refills, so that workers
+    keep serving other chats. RetryAfter errors pause all sending for the time
+    requested by Telegram and the call is retried.
+    Before start() (e.g. in scripts) calls are executed directly.
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        global_burst: float,
+        chat_rate: float,
+        chat_burst: float,
+        workers: int,
+        max_retries: int,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers_count = workers
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        # Calls waiting for a chat token outside of the queue, by sequence number
+        self._deferred: Dict[int, Tuple[asyncio.TimerHandle, tuple]] = {}
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._sent_times = deque(maxlen=10000)
+        self.sent = 0
+        self.failed = 0
+        self.retry_after_count = 0
+
+    def start(self):
+        """Starts sending workers. Must be called on the bot's event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers_count)
+        ]
+        logger.info(f"Telegram sender started with {self.workers_count} workers")
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Waits for queued calls to finish (up to timeout) and stops workers.
+        Must be called while the bot is still initialized (post_stop).
+        Calls that were not sent by then fail, so that their callers do not hang.
+        """
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Telegram sender stopped with "
+                f"{self._queue.qsize() + len(self._deferred)} queued calls"
+            )
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        unsent = []
+        for handle, item in self._deferred.values():
+            handle.cancel()
+            unsent.append(item)
+        self._deferred.clear()
+        while not self._queue.empty():
+            unsent.append(self._queue.get_nowait())
+        for item in unsent:
+            self._fail_stopped(item[-1])
+        self._workers = []
+        self._queue = None
+
+    async def send_message(
+        self, bot: Bot, chat_id: int, text: str, priority: int = BROADCAST, **kwargs
+    ) -> Message:
+        """Sends a message to the chat."""
+        return await self.submit(
+            chat_id,
+            lambda: bot.send_message(chat_id=chat_id, text=text, **kwargs),
+            priority,
+        )
+
+    async def reply_text(
+        self, message: Message, text: str, priority: int = INTERACTIVE, **kwargs
+    ) -> Message:
+        """Replies to the message."""
+        return await self.submit(
+            message.chat_id, lambda: message.reply_text(text, **kwargs), priority
+        )
+
+    async def reply_voice(
+        self, message: Message, voice: bytes, priority: int = INTERACTIVE, **kwargs
+    ) -> Message:
+        """Replies to the message with a voice message."""
+        return await self.submit(
+            message.chat_id,
+            lambda: message.reply_voice(voice=voice, **kwargs),
+            priority,
+        )
+
+    async def edit_text(
+        self, message: Message, text: str, priority: int = INTERACTIVE, **kwargs
+    ) -> Message:
+        """Edits the message sent by bot."""
+        return await self.submit(
+            message.chat_id, lambda: message.edit_text(text, **kwargs), priority
+        )
+
+    async def submit(self, chat_id: int, call: Callable[[], Awaitable], priority: int):
+        """Queues a Telegram API call and waits for its result."""
+        with span("telegram_send", priority=priority):
+            if not self._workers:
+                return await call()
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put(
+                (priority, next(self._sequence), chat_id, call, future)
+            )
+            return await future
+
+    def stats(self) -> Dict[str, float]:
+        """Returns counters, queue depth and throughput over the last minute."""
+        now = time.monotonic()
+        sent_last_minute = sum(1 for sent_at in self._sent_times if now - sent_at <= 60)
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retry_after": self.retry_after_count,
+            "sent_per_second_1m": round(sent_last_minute / 60, 2),
+            "chats_tracked": len(self._chat_buckets),
+        }
+
+    async def _worker(self):
+        """Takes calls from the queue and executes them within rate limits."""
+        while True:
+            item = await self._queue.get()
+            _, _, chat_id, call, future = item
+            deferred = False
+            try:
+                if future.cancelled():
+                    continue
+                wait = await self._acquire(chat_id, wait_for_chat=False)
+                if wait:
+                    # Keeps its place in the queue order and stays unfinished for join()
+                    deferred = True
+                    handle = asyncio.get_running_loop().call_later(
+                        wait, self._requeue, item
+                    )
+                    self._deferred[item[1]] = (handle, item)
+                    continue
+                result = await self._execute(chat_id, call)
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                # Stopped while the call was being sent
+                self._fail_stopped(future)
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                if not deferred:
+                    self._queue.task_done()
+
+    def _requeue(self, item: tuple):
+        """Puts a deferred call back in the queue, it was counted as unfinished meanwhile."""
+        self._deferred.pop(item[1], None)
+        self._queue.put_nowait(item)
+        self._queue.task_done()
+
+    def _fail_stopped(self, future: asyncio.Future):
+        if not future.done():
+            self.failed += 1
+            future.set_exception(
+                RuntimeError("Telegram sender stopped before the call was sent")
+            )
+
+    async def _execute(self, chat_id: int, call: Callable[[], Awaitable]):
+        """Executes the call (tokens are taken by the worker), honoring RetryAfter."""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await self._acquire(chat_id, wait_for_chat=True)
+            call_start = time.perf_counter()
+            try:
+                result = await call()
+            except RetryAfter as e:
+                TELEGRAM_SEND_DURATION.observe(
+                    time.perf_counter() - call_start, "retry_after"
+                )
+                if attempt == self.max_retries:
+                    raise
+                self.retry_after_count += 1
+                retry_after = e.retry_after
+                if not isinstance(retry_after, (int, float)):
+                    retry_after = retry_after.total_seconds()
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+                logger.warning(
+                    f"Telegram flood limit hit (chat {chat_id}), "
+                    f"pausing sends for {retry_after}s"
+                )
+                continue
+            except Exception:
+                TELEGRAM_SEND_DURATION.observe(
+                    time.perf_counter() - call_start, "error"
+                )
+                raise
+            TELEGRAM_SEND_DURATION.observe(time.perf_counter() - call_start, "ok")
+            self.sent += 1
+            self._sent_times.append(time.monotonic())
+            return result
+
+    async def _acquire(self, chat_id: int, wait_for_chat: bool) -> float:
+        """
+        Waits until sending is not paused and both buckets have a token. Without
+        wait_for_chat, returns the seconds until the chat's bucket has a token
+        instead of waiting for it (0 when the tokens were taken).
+        """
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            wait = self._chat_bucket(chat_id).take()
+            if wait:
+                if not wait_for_chat:
+                    return wait
+                await asyncio.sleep(wait)
+                continue
+            wait = self.global_bucket.take()
+            if wait:
+                # Give the chat token back, it is taken again after the wait
+                bucket = self._chat_bucket(chat_id)
+                bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+                await asyncio.sleep(wait)
+                continue
+            return 0.0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= 10000:
+                self._prune_chat_buckets()
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_chat_buckets(self):
+        """Drops buckets of chats that were idle long enough to be full again."""
+        now = time.monotonic()
+        idle_seconds = self.chat_burst / self.chat_rate
+        self._chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self._chat_buckets.items()
+            if now - bucket.updated_at < idle_seconds
+        }
+
+
+telegram_sender = TelegramSender(
+    global_rate=app_settings.TELEGRAM_GLOBAL_RATE,
+    global_burst=app_settings.TELEGRAM_GLOBAL_BURST,
+    chat_rate=app_settings.TELEGRAM_CHAT_RATE,
+    chat_burst=app_settings.TELEGRAM_CHAT_BURST,
+    workers=app_settings.TELEGRAM_SEND_WORKERS,
+    max_retries=app_settings.TELEGRAM_MAX_RETRIES,
+)
+
+registry.gauge(
+    "telegram_send_queue_depth",
+    "Outbound Telegram calls waiting to be sent",
+    callback=lambda: telegram_sender.stats()["queue_depth"],
+)
+registry.counter(
+    "telegram_sender_calls_total",
+    "Outbound Telegram calls by result",
+    ["result"],
+    callback=lambda: {
+        ("sent",): telegram_sender.sent,
+        ("failed",): telegram_sender.failed,
+        ("retry_after",): telegram_sender.retry_after_count,
+    },
+)
@@ -0,0 +1,297 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from logging import getLogger
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from src.config import app_settings
+from src.logging_config import LOG_DIR, make_background_handler, set_record_context
+
+logger = getLogger(__name__)
+
+
+class Span:
+    """Timed stage of a trace. A span without parent is the root of a trace."""
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "parent",
+        "root",
+        "children",
+        "start_time",
+        "duration",
+        "trace_id",
+        "_token",
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.children: List[Span] = []
+        self.start_time = 0.0
+        self.duration: Optional[float] = None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        if self.parent is not None:
+            self.parent.children.append(self)
+        self._token = _current_span.set(self)
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self.start_time
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited in another context (e.g. async generator closed elsewhere)
+            _current_span.set(self.parent)
+        if self.parent is None:
+            trace_recorder.record(self)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self, offset: float = None) -> dict:
+        offset = self.start_time if offset is None else offset
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start_time - offset) * 1000, 1),
+            "duration_ms": (
+                round(self.duration * 1000, 1) if self.duration is not None else None
+            ),
+        }
+        if self.attributes:
+            data["attributes"] = self.attributes
+        if self.children:
+            data["children"] = [child.to_dict(offset) for child in self.children]
+        return data
+
+
+class _NoopSpan:
+    """Returned outside of traces, so that instrumentation costs next to nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """Returns the active span of the current handler or task."""
+    span_ = _current_span.get()
+    # Tasks started inside a finished trace do not add to it
+    if span_ is None or span_.root.duration is not None:
+        return None
+    return span_
+
+
+def current_trace_id() -> Optional[str]:
+    span_ = current_span()
+    return span_.trace_id if span_ is not None else None
+
+
+def start_trace(name: str, **attributes):
+    """
+    Starts a trace (use as a context manager). Inside an active trace this is
+    a child span, e.g. the text handler called by the voice handler.
+    """
+    if not app_settings.TRACING_ENABLED:
+        return NOOP_SPAN
+    return Span(name, current_span(), attributes)
+
+
+def set_trace_attributes(**attributes):
+    """Adds attributes (e.g. user_id) to the root span of the active trace."""
+    span_ = current_span()
+    if span_ is not None:
+        span_.root.attributes.update(attributes)
+
+
+def detach_trace():
+    """Makes the current task start from scratch, e.g. a background task created by a handler."""
+    _current_span.set(None)
+
+
+def span(name: str, **attributes):
+    """Child span of the active trace (use as a context manager)."""
+    parent = current_span()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent, attributes)
+
+
+def add_span(name: str, start_time: float, **attributes):
+    """
+    Adds a span that started at start_time (time.perf_counter()) and ends now.
+    For stages that cannot run in a block, e.g. an async generator yielding to its caller.
+    """
+    parent = current_span()
+    if parent is None:
+        return
+    child = Span(name, parent, attributes)
+    child.start_time = start_time
+    child.duration = time.perf_counter() - start_time
+    parent.children.append(child)
+
+
+def traced(name: str = None, root: bool = False):
+    """Decorator running a sync or async function in a span (or a trace if root=True)."""
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+        make_span = start_trace if root else span
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with make_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with make_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TraceRecorder:
+    """
+    Keeps the slowest recent traces in memory and writes a sample of traces
+    slower than the threshold to a rotating JSON lines file.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float,
+        sample_rate: float,
+        keep: int,
+        file_path: str,
+        max_bytes: int,
+        backup_count: int,
+    ):
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self.traces = 0
+        self.slow_traces = 0
+        self._file_logger = logging.getLogger("src.tracing.slow")
+        self._file_logger.propagate = False
+        self._file_logger.setLevel(logging.INFO)
+        if file_path and not self._file_logger.handlers:
+            handler = RotatingFileHandler(
+                file_path,
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                encoding="utf-8",
+                delay=True,
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            # Written on the logging thread in queue mode, like other log files
+            self._file_logger.addHandler(make_background_handler(handler))
+
+    def record(self, root: Span):
+        self.traces += 1
+        if root.duration < self.slow_threshold:
+            return
+        self.slow_traces += 1
+        data = {
+            "trace_id": root.trace_id,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            **root.to_dict(),
+        }
+        with self._lock:
+            self._recent.append(data)
+        if random.random() < self.sample_rate:
+            self._file_logger.info(json.dumps(data, ensure_ascii=False, default=str))
+
+    def slowest(self, limit: int = 5) -> List[Dict]:
+        """Returns the slowest of the recent slow traces."""
+        with self._lock:
+            traces = list(self._recent)
+        return sorted(traces, key=lambda trace: trace["duration_ms"], reverse=True)[
+            :limit
+        ]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "traces": self.traces,
+            "slow_traces": self.slow_traces,
+            "slow_threshold_s": self.slow_threshold,
+        }
+
+
+def format_trace(trace: dict) -> str:
+    """Formats a trace as an indented tree of spans with durations."""
+    lines = [f"{trace.get('time', '')} trace {trace.get('trace_id', '')}"]
+
+    def add(node: dict, depth: int):
+        attributes = node.get("attributes")
+        details = (
+            " " + ", ".join(f"{key}={value}" for key, value in attributes.items())
+            if attributes
+            else ""
+        )
+        lines.append(
+            f"{'  ' * depth}{node['name']} +{node['start_ms']:.0f}ms "
+            f"{node['duration_ms'] or 0:.0f}ms{details}"
+        )
+        for child in node.get("children", ()):
+            add(child, depth + 1)
+
+    add(trace, 0)
+    return "\n".join(lines)
+
+
+trace_recorder = TraceRecorder(
+    slow_threshold=app_settings.TRACE_SLOW_THRESHOLD_SECONDS,
+    sample_rate=app_settings.TRACE_SLOW_SAMPLE_RATE,
+    keep=app_settings.TRACE_RECENT_SLOW_TRACES,
+    file_path=os.path.join(LOG_DIR, "slow_traces.jsonl"),
+    max_bytes=app_settings.TRACE_FILE_MAX_BYTES,
+    backup_count=app_settings.TRACE_FILE_BACKUP_COUNT,
+)
+
+
+def _log_context():
+    span_ = current_span()
+    if span_ is None:
+        return None, None
+    return span_.root.attributes.get("user_id"), span_.trace_id
+
+
+# Log records of an update carry its user and trace ids
+set_record_context(_log_context)
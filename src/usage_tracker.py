@@ -0,0 +1,125 @@
+import datetime as dt
+from contextvars import ContextVar
+from logging import getLogger
+from typing import Dict, Optional, Tuple
+
+from src.config import app_settings
+from src.dal.async_usage_repo import AsyncUsageRepository
+
+logger = getLogger(__name__)
+
+# User the current handler or job calls LLM for (0 when it is not user specific)
+usage_user_id: ContextVar[int] = ContextVar("usage_user_id", default=0)
+
+# Usage of the last LLM call made in the current context, taken by save_message
+last_usage: ContextVar[Optional[Dict]] = ContextVar("last_usage", default=None)
+
+Counters = Dict[Tuple[dt.date, object], list]
+
+
+def set_usage_user(user_id: int):
+    """Attributes LLM calls made further in the current handler or task to the user."""
+    usage_user_id.set(user_id or 0)
+
+
+def reset_usage_context():
+    """
+    Clears the usage user and the last usage. Handlers of consecutive updates
+    run in the same task, so this is done at the start of every update.
+    """
+    usage_user_id.set(0)
+    last_usage.set(None)
+
+
+def pop_last_usage() -> Optional[Dict]:
+    """Returns usage of the last LLM call (None if usage tracking is off) and resets it."""
+    usage = last_usage.get()
+    last_usage.set(None)
+    return usage
+
+
+class UsageAggregator:
+    """
+    Accumulates LLM usage per day and user and per day and model in memory.
+    flush() adds the accumulated counters to the daily rollup tables, so the
+    database gets a few upserts per interval instead of one per LLM call.
+    """
+
+    def __init__(self):
+        self._users: Counters = {}
+        self._models: Counters = {}
+        self.recorded = 0
+
+    def record(
+        self, model: str, prompt_tokens: int, completion_tokens: int, latency_ms: int
+    ):
+        """Records usage of an LLM call made in the current context."""
+        usage = {
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": latency_ms,
+        }
+        last_usage.set(usage)
+
+        today = dt.date.today()
+        counters = (1, prompt_tokens, completion_tokens, latency_ms)
+        for table, key in (
+            (self._users, (today, usage_user_id.get())),
+            (self._models, (today, model)),
+        ):
+            total = table.setdefault(key, [0, 0, 0, 0])
+            for i, value in enumerate(counters):
+                total[i] += value
+        self.recorded += 1
+
+    async def flush(self) -> int:
+        """Adds accumulated counters to the rollup tables. Returns number of rows."""
+        users, self._users = self._users, {}
+        models, self._models = self._models, {}
+        if not users and not models:
+            return 0
+
+        try:
+            await AsyncUsageRepository.add_daily_usage(
+                [(*key, *total) for key, total in users.items()],
+                [(*key, *total) for key, total in models.items()],
+            )
+        except Exception:
+            # Keep the counters for the next flush
+            self._merge(self._users, users)
+            self._merge(self._models, models)
+            raise
+        return len(users) + len(models)
+
+    @staticmethod
+    def _merge(target: Counters, source: Counters):
+        for key, total in source.items():
+            current = target.setdefault(key, [0, 0, 0, 0])
+            for i, value in enumerate(total):
+                current[i] += value
+
+
+usage_aggregator = UsageAggregator()
+
+
+def record_llm_usage(model: str, usage, latency_seconds: float):
+    """Records usage reported by LLM provider if usage tracking is on."""
+    if not app_settings.USAGE_TRACKING or usage is None:
+        return
+    usage_aggregator.record(
+        model,
+        usage.prompt_tokens or 0,
+        usage.completion_tokens or 0,
+        int(latency_seconds * 1000),
+    )
+
+
+async def flush_usage():
+    """Background job: writes accumulated usage to the daily rollup tables."""
+    try:
+        rows = await usage_aggregator.flush()
+        if rows:
+            logger.info(f"Flushed {rows} usage rollup rows")
+    except Exception as e:
+        logger.error(f"Error flushing usage rollups: {e}", exc_info=True)
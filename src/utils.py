@@ -1,14 +1,29 @@
+import asyncio
 import datetime as dt
 import time
-import gc
 from logging import getLogger
-from typing import List, Union, Dict
+from typing import AsyncIterator, List, Tuple, Union, Dict
 import re
 
-from openai import OpenAI
-
 from src.config import app_settings
-from src.dal import MessagesRepository, UsersRepository
+from src.dal import (
+    AsyncMessagesRepository,
+    AsyncSummariesRepository,
+    AsyncUsersRepository,
+    MessagesRepository,
+)
+from src.llm_client import get_llm_client
+from src.llm_dispatcher import INTERACTIVE, llm_dispatcher
+from src.llm_resilience import llm_caller
+from src.logging_config import log_payload
+from src.metrics import LLM_ERRORS, LLM_REQUEST_DURATION, LLM_TOKENS
+from src.tracing import add_span, span, traced
+from src.usage_tracker import record_llm_usage, set_usage_user
+from src.prompt_builder import (
+    count_message_tokens,
+    fit_history_to_budget,
+    prompt_token_stats,
+)
 
 logger = getLogger(__name__)
 
@@ -28,7 +43,7 @@ def clean_llm_response(text: str) -> str:
     return text
 
 
-def load_history_and_generate_answer(
+async def load_history_and_generate_answer(
     user_id: int,
     user_input: str,
     assistant_prompt: str = None,
@@ -43,19 +58,12 @@ def load_history_and_generate_answer(
             logger.info("User input and assistant prompt are empty. SKIPPING")
             return ""
 
-        # Get user data and recent messages
-        user_data = UsersRepository.get_user_by_id(user_id)
-        messages_history = MessagesRepository.get_recent_messages(
-            user_id, limit=10
-        )  # Reduced from 50 to save memory
-
-        # Update system prompt
-        system_prompt_updated = update_system_prompt(
-            messages_history, app_settings.SYSTEM_PROMPT, user_data
-        )
+        system_prompt, context = await load_history_and_update_system_prompt(user_id)
 
         # Generate response
-        output = generate_answer(user_input, system_prompt_updated, assistant_prompt)
+        output = await generate_answer(
+            user_input, system_prompt, assistant_prompt, context
+        )
 
         processing_time = time.time() - start_time
         logger.info(f"Total message processing took {processing_time:.2f}s")
@@ -64,144 +72,401 @@ def load_history_and_generate_answer(
     except Exception as e:
         logger.error(f"Error generating response: {e}", exc_info=True)
         return "I'm having trouble processing your message right now. Please try again in a moment."
-    finally:
-        gc.collect()  # Force garbage collection
 
 
-def generate_answer(
-    user_input: str, system_prompt: str = None, assistant_prompt: str = None
-) -> str:
+async def load_history_and_stream_answer(
+    user_id: int,
+    user_input: str,
+    assistant_prompt: str = None,
+) -> AsyncIterator[str]:
     """
-    Calls LLM using system prompt and user's text message.
-    Language model and system prompt are specified in .env configuration file.
+    Same as load_history_and_generate_answer, but yields the raw LLM output
+    piece by piece as it is generated.
     """
     start_time = time.time()
     try:
         if not user_input and not assistant_prompt:
-            logger.info("User input is empty. SKIPPING")
-            return ""
+            logger.info("User input and assistant prompt are empty. SKIPPING")
+            return
 
-        model = app_settings.LANGUAGE_MODEL
-        system_prompt = system_prompt if system_prompt else app_settings.SYSTEM_PROMPT
-
-        # Update system prompt with current time and formatting instructions
-        system_prompt_updated = (
-            f"Just in case someone asks you about what day is it today, "
-            f"you know that current time is {start_time} and you answer the name "
-            f"of a day of a week initially and say full date only "
-            f"if you are explicitly asked to do this.\n\n"
-            f"IMPORTANT: Do not use any markdown formatting in your responses. "
-            f"Specifically:\n"
-            f"- Do not use asterisks (*) or backticks (`) for emphasis\n"
-            f"- Do not use hashtags (#) for headers\n"
-            f"- Do not use any other special formatting characters\n"
-            f"Just write plain text.\n\n" + system_prompt
-        )
+        system_prompt, context = await load_history_and_update_system_prompt(user_id)
+    except Exception as e:
+        logger.error(f"Error generating response: {e}", exc_info=True)
+        yield "I'm having trouble processing your message right now. Please try again in a moment."
+        return
+
+    async for delta in stream_answer(
+        user_input, system_prompt, assistant_prompt, context
+    ):
+        yield delta
+
+    processing_time = time.time() - start_time
+    logger.info(f"Total message processing took {processing_time:.2f}s")
 
-        if assistant_prompt:
-            user_input = assistant_prompt + user_input
-            logger.info(
-                f"ASSISTANT PROMPT is specified (user_input is going "
-                f"to be substituted by it): '{user_input}'"
-            )
 
-        client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=app_settings.OPENROUTER_API_KEY,
+@traced()
+async def load_history_and_update_system_prompt(user_id: int) -> Tuple[str, str]:
+    """
+    Loads user data and recent messages from DB.
+    Returns the system prompt formatted with user data and the conversation context.
+    """
+    # LLM calls made with this prompt are accounted to the user
+    set_usage_user(user_id)
+
+    # Get user data, the rolling summary and the messages it does not cover yet
+    user_data = await AsyncUsersRepository.get_user_by_id(user_id)
+    if app_settings.SUMMARY_ENABLED:
+        summary, last_message_id = (
+            await AsyncSummariesRepository.get_cached_summary_state(user_id)
+        )
+        # The summary job runs behind the conversation, the token budget
+        # drops the oldest of these messages if there are too many
+        messages_history = await AsyncMessagesRepository.get_messages_after(
+            user_id, last_message_id, limit=app_settings.PROMPT_MAX_HISTORY_MESSAGES
         )
+    else:
+        summary = ""
+        messages_history = await AsyncMessagesRepository.get_recent_messages(
+            user_id, limit=app_settings.SUMMARY_KEEP_LAST_TURNS
+        )
+
+    system_prompt = format_system_prompt(app_settings.SYSTEM_PROMPT, user_data)
+    context = build_conversation_context(messages_history, summary)
+    return system_prompt, context
+
+
+# Static instructions go first so that the prompt prefix is the same for every request
+# and can be served from the provider's prompt cache
+FORMATTING_INSTRUCTIONS = (
+    "IMPORTANT: Do not use any markdown formatting in your responses. "
+    "Specifically:\n"
+    "- Do not use asterisks (*) or backticks (`) for emphasis\n"
+    "- Do not use hashtags (#) for headers\n"
+    "- Do not use any other special formatting characters\n"
+    "Just write plain text.\n\n"
+)
 
+
+def build_llm_messages(
+    user_input: str,
+    system_prompt: str = None,
+    assistant_prompt: str = None,
+    context: str = "",
+) -> List[Dict]:
+    """
+    Builds the list of chat messages sent to LLM.
+    System message layout: formatting instructions and system prompt (static),
+    then conversation context and current date (volatile).
+    """
+    system_prompt = system_prompt if system_prompt else app_settings.SYSTEM_PROMPT
+    static_part = FORMATTING_INSTRUCTIONS + system_prompt
+
+    # Day granularity keeps the volatile part the same during the day
+    today = dt.date.today()
+    volatile_part = (
+        f"{context}\n\n"
+        f"Just in case someone asks you about what day is it today, "
+        f"you know that today is {today:%A, %d %B %Y} and you answer the name "
+        f"of a day of a week initially and say full date only "
+        f"if you are explicitly asked to do this."
+    )
+
+    if app_settings.PROMPT_CACHE_CONTROL:
+        # Explicit cache breakpoint for providers that need it (e.g. Anthropic models)
+        system_content = [
+            {
+                "type": "text",
+                "text": static_part,
+                "cache_control": {"type": "ephemeral"},
+            },
+            {"type": "text", "text": volatile_part},
+        ]
+    else:
+        system_content = f"{static_part}\n{volatile_part}"
+
+    if assistant_prompt:
+        user_input = assistant_prompt + user_input
         logger.info(
-            f"USER PROMPT (user input, the message that is sent to LLM): '{user_input}'"
+            f"ASSISTANT PROMPT is specified ({len(assistant_prompt)} chars), "
+            f"prepended to the user input"
         )
-        messages = [
-            {"role": "system", "content": system_prompt_updated},
-            {"role": "user", "content": user_input},
-        ]
 
-        logger.info("Generating LLM response... ")
+    logger.info(
+        f"USER PROMPT (the message that is sent to LLM): {len(user_input)} chars"
+    )
+    log_payload("user prompt", user_input)
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": user_input},
+    ]
+
+
+def log_usage(usage, estimated_prompt_tokens: int = None):
+    """Logs token usage reported by LLM provider."""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    if estimated_prompt_tokens is not None:
+        prompt_token_stats.record(
+            estimated_prompt_tokens, usage.prompt_tokens, cached_tokens
+        )
+    logger.info(
+        f"NUMBER OF TOKENS used per OpenAI API request: {usage.total_tokens}. "
+        f"System prompt (+ conversation history): {usage.prompt_tokens} "
+        f"({cached_tokens} from prompt cache). "
+        f"Generated response: {usage.completion_tokens}."
+    )
+
 
-        response = client.chat.completions.create(
+def observe_llm_call(model: str, kind: str, latency: float, usage):
+    """Records LLM call duration and tokens in metrics."""
+    LLM_REQUEST_DURATION.observe(latency, model, kind)
+    if usage is not None:
+        LLM_TOKENS.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+        LLM_TOKENS.inc(model, "completion", amount=usage.completion_tokens or 0)
+
+
+async def request_completion(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.7,  # Lower temperature for more focused responses
+    max_tokens: int = 500,  # Limit response length
+    priority: int = INTERACTIVE,
+) -> str:
+    """
+    Sends chat messages to LLM and returns raw output. Errors are raised to the caller.
+    The request waits for a free slot of its priority class (see src/llm_dispatcher.py)
+    and runs with a deadline, hedging and the fallback model (see src/llm_resilience.py).
+    """
+    estimated_tokens = count_message_tokens(messages)
+
+    def create(model: str):
+        return get_llm_client().chat.completions.create(
             model=model,
             messages=messages,
-            temperature=0.7,  # Lower temperature for more focused responses
-            max_tokens=500,  # Limit response length
+            temperature=temperature,
+            max_tokens=max_tokens,
         )
-        output = response.choices[0].message.content
 
-        # Clean any markdown formatting from the response
-        output = clean_llm_response(output)
+    async with llm_dispatcher.slot(priority):
+        request_start = time.monotonic()
+        with span("llm_completion") as llm_span:
+            try:
+                response = await llm_caller.call(app_settings.LANGUAGE_MODEL, create)
+            except Exception:
+                LLM_ERRORS.inc("completion")
+                raise
+            latency = time.monotonic() - request_start
+            model = response.model or app_settings.LANGUAGE_MODEL
+            if response.usage is not None:
+                llm_span.set(
+                    model=model,
+                    prompt_tokens=response.usage.prompt_tokens,
+                    completion_tokens=response.usage.completion_tokens,
+                )
+    log_usage(response.usage, estimated_tokens)
+    observe_llm_call(model, "completion", latency, response.usage)
+    record_llm_usage(model, response.usage, latency)
+    return response.choices[0].message.content
+
+
+async def generate_answer(
+    user_input: str,
+    system_prompt: str = None,
+    assistant_prompt: str = None,
+    context: str = "",
+    priority: int = INTERACTIVE,
+) -> str:
+    """
+    Calls LLM using system prompt and user's text message.
+    Language model and system prompt are specified in .env configuration file.
+    """
+    start_time = time.time()
+    try:
+        if not user_input and not assistant_prompt:
+            logger.info("User input is empty. SKIPPING")
+            return ""
 
-        usage = response.usage
-        logger.info(
-            f"NUMBER OF TOKENS used per OpenAI API request: {usage.total_tokens}. "
-            f"System prompt (+ conversation history): {usage.prompt_tokens}. "
-            f"Generated response: {usage.completion_tokens}."
+        messages = build_llm_messages(
+            user_input, system_prompt, assistant_prompt, context
         )
 
+        logger.info("Generating LLM response... ")
+
+        output = await request_completion(messages, priority=priority)
+
+        # Clean any markdown formatting from the response
+        output = clean_llm_response(output)
+
         processing_time = time.time() - start_time
         logger.info(f"LLM response generation took {processing_time:.2f}s")
-        logger.info(f"LLM's output: {output}")
+        log_payload("output", output)
 
         return output
 
     except Exception as e:
         logger.error(f"Error in LLM call: {e}", exc_info=True)
         return "I'm having trouble generating a response right now. Please try again in a moment."
-    finally:
-        gc.collect()  # Force garbage collection
 
 
-def update_system_prompt(
-    messages: List[Dict[str, Union[str, dt.datetime]]],
-    system_prompt: str = app_settings.SYSTEM_PROMPT,
-    user_data=None,
-) -> str:
-    """Adds context (previous messages from the chat) to the system prompt."""
+async def stream_answer(
+    user_input: str,
+    system_prompt: str = None,
+    assistant_prompt: str = None,
+    context: str = "",
+) -> AsyncIterator[str]:
+    """
+    Calls LLM in streaming mode and yields raw pieces of the output as they arrive.
+    The caller is responsible for cleaning the accumulated text with clean_llm_response.
+    """
+    start_time = time.time()
+    span_start = time.perf_counter()
+    first_token_time = None
+    produced = False
+    try:
+        if not user_input and not assistant_prompt:
+            logger.info("User input is empty. SKIPPING")
+            return
 
-    logger.info(
-        "Enriching system prompt with chat history for adding 'context knowledge' to model."
-    )
-    system_prompt = system_prompt.format(
+        messages = build_llm_messages(
+            user_input, system_prompt, assistant_prompt, context
+        )
+        estimated_tokens = count_message_tokens(messages)
+
+        logger.info("Streaming LLM response... ")
+
+        # Streamed replies are always interactive, the slot is held until the end
+        async with llm_dispatcher.slot(INTERACTIVE):
+            # Streams are not hedged, the breaker only switches them to the fallback model
+            model = llm_caller.model_for_stream(app_settings.LANGUAGE_MODEL)
+            # The deadline covers the whole time spent waiting for the provider,
+            # a stream that stalls mid-way is aborted as well
+            remaining = app_settings.LLM_REQUEST_DEADLINE
+            stream = None
+            try:
+                # Also settles the breaker when the consumer closes or cancels this generator
+                with llm_caller.stream_outcome(model, app_settings.LANGUAGE_MODEL):
+                    wait_start = time.monotonic()
+                    stream = await asyncio.wait_for(
+                        get_llm_client().chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=0.7,
+                            max_tokens=500,
+                            stream=True,
+                            stream_options={"include_usage": True},
+                        ),
+                        remaining,
+                    )
+                    remaining -= time.monotonic() - wait_start
+                    chunks = stream.__aiter__()
+                    while True:
+                        wait_start = time.monotonic()
+                        try:
+                            chunk = await asyncio.wait_for(
+                                chunks.__anext__(), max(remaining, 0)
+                            )
+                        except StopAsyncIteration:
+                            break
+                        remaining -= time.monotonic() - wait_start
+                        if chunk.usage is not None:
+                            log_usage(chunk.usage, estimated_tokens)
+                            observe_llm_call(
+                                chunk.model or model,
+                                "stream",
+                                time.time() - start_time,
+                                chunk.usage,
+                            )
+                            record_llm_usage(
+                                chunk.model or model,
+                                chunk.usage,
+                                time.time() - start_time,
+                            )
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                                logger.info(
+                                    f"LLM first token after "
+                                    f"{first_token_time - start_time:.2f}s"
+                                )
+                            produced = True
+                            yield delta
+            finally:
+                # Releases the HTTP response, also when the consumer stopped early
+                if stream is not None:
+                    await stream.close()
+
+        processing_time = time.time() - start_time
+        logger.info(f"LLM response streaming took {processing_time:.2f}s")
+        # The generator yields to its caller, so the stream is added as a finished span
+        add_span(
+            "llm_stream",
+            span_start,
+            model=model,
+            first_token_ms=(
+                round((first_token_time - start_time) * 1000)
+                if first_token_time
+                else None
+            ),
+        )
+
+    except Exception as e:
+        add_span("llm_stream", span_start, error=type(e).__name__)
+        LLM_ERRORS.inc("stream")
+        logger.error(f"Error in LLM call: {e}", exc_info=True)
+        if not produced:
+            yield "I'm having trouble generating a response right now. Please try again in a moment."
+
+
+def format_system_prompt(
+    system_prompt: str = app_settings.SYSTEM_PROMPT, user_data=None
+) -> str:
+    """Fills user's profile into the system prompt."""
+    return system_prompt.format(
         native_language=user_data["native_language"],
         target_language=user_data["target_language"],
         current_level=user_data["current_level"],
         learning_goal=user_data["learning_goal"],
     )
 
-    summarized_history = summarize_history(messages)
-    updated_prompt = f"{system_prompt}\n{summarized_history}"
 
-    return updated_prompt
+def build_conversation_context(
+    messages: List[Dict[str, Union[str, dt.datetime]]], summary: str = ""
+) -> str:
+    """
+    Builds context (summary and previous messages from the chat) for the system prompt.
+    History is fitted into PROMPT_HISTORY_TOKEN_BUDGET tokens dropping the oldest turns first.
+    """
+    logger.info(
+        "Enriching system prompt with chat history for adding 'context knowledge' to model."
+    )
+    messages, summary = fit_history_to_budget(
+        messages, summary, app_settings.PROMPT_HISTORY_TOKEN_BUDGET
+    )
+    return summarize_history(messages, summary)
 
 
 def summarize_history(
-    messages: List[Dict[str, Union[str, dt.datetime]]], n_last_messages: int = None
+    messages: List[Dict[str, Union[str, dt.datetime]]], summary: str = ""
 ) -> str:
     """
-    Condense older messages to reduce token usage. Returns a string summary.
+    Combines the rolling summary of older messages (see src/summarizer.py)
+    with the latest messages. Returns a string.
     """
-    if n_last_messages and len(messages) > n_last_messages:
+    if summary:
+        summary = "Summary of previous conversations: " + summary
         prefix = f"Latest messages in the conversation are: "
-
-        # TODO: add summarization with AI for cases when history of dialogue is too long
-        summary = "Summary of previous conversations: " + " ".join(
-            msg["content"] for msg in messages[:-n_last_messages]
-        )
-
-        recent_messages = messages[-n_last_messages:]
     else:
-        summary = ""
         prefix = "The history of your conversation with user:"
-        recent_messages = messages
 
-    messages_str = MessagesRepository.join_messages_to_string(recent_messages)
+    messages_str = MessagesRepository.join_messages_to_string(messages)
 
     previous_dialogue = f"{summary}\n{prefix}\n{messages_str}"
-    logger.info(
-        "Format SYSTEM PROMPT with the conversation history:\n"
-        + previous_dialogue
-        + "\n\n"
-    )
+    logger.info(f"Conversation context: {len(messages)} messages")
+    log_payload("context", previous_dialogue)
     return previous_dialogue
 
 
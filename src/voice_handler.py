@@ -5,13 +5,18 @@ from functools import wraps
 from typing import Optional, Tuple
 import logging
 from pathlib import Path
-import gc
 
 # import whisper
 # from gtts import gTTS
 from telegram import Update
 from telegram.ext import CallbackContext
 
+from src.metrics import VOICE_TRANSCRIPTION_DURATION, observe_handler_time
+from src.logging_config import log_payload
+from src.memory_governor import memory_governor
+from src.telegram_sender import telegram_sender
+from src.tracing import span
+
 logger = logging.getLogger(__name__)
 
 # Initialize Whisper model globally to avoid reloading
@@ -44,8 +49,6 @@ def cleanup_file(func):
                         logger.debug(f"Cleaned up temporary file: {file}")
                 except Exception as e:
                     logger.error(f"Error cleaning up file {file}: {e}")
-            # Force garbage collection after file operations
-            gc.collect()
 
     return wrapper
 
@@ -153,9 +156,8 @@ class VoiceHandler:
                 )
 
             processing_time = time.time() - start_time
-            logger.info(
-                f"Successfully transcribed in {processing_time:.2f}s: {transcribed_text}"
-            )
+            logger.info(f"Successfully transcribed in {processing_time:.2f}s")
+            log_payload("transcription", transcribed_text)
             return True, transcribed_text
 
         except FileNotFoundError as e:
@@ -170,9 +172,6 @@ class VoiceHandler:
                 False,
                 "Sorry, there was an error processing your voice message. Please try again.",
             )
-        finally:
-            # Force garbage collection after heavy processing
-            gc.collect()
 
     @cleanup_file
     async def text_to_voice(
@@ -207,10 +206,8 @@ class VoiceHandler:
         except Exception as e:
             logger.error(f"Error converting text to voice: {e}", exc_info=True)
             return False, "Sorry, there was an error generating the voice message."
-        finally:
-            # Force garbage collection after processing
-            gc.collect()
 
+    @observe_handler_time
     async def handle_voice_message(self, update: Update, context: CallbackContext):
         """Handle incoming voice messages"""
         chat_id = update.message.chat_id
@@ -223,14 +220,20 @@ class VoiceHandler:
             await context.bot.send_chat_action(chat_id=chat_id, action="typing")
 
             # Transcribe voice
-            success, result = await self.transcribe_voice_message(update, context)
+            transcription_start = time.perf_counter()
+            with span("voice_transcription"):
+                success, result = await self.transcribe_voice_message(update, context)
+            VOICE_TRANSCRIPTION_DURATION.observe(
+                time.perf_counter() - transcription_start, "ok" if success else "failed"
+            )
             if not success:
-                await update.message.reply_text(result)
+                await telegram_sender.reply_text(update.message, result)
                 return
 
             # Echo what we understood
-            await update.message.reply_text(
-                f"In your voice message you said:\n'{result}'"
+            await telegram_sender.reply_text(
+                update.message,
+                f"In your voice message you said:\n'{result}'",
             )
 
             # Process the text message normally using the existing handler
@@ -240,19 +243,21 @@ class VoiceHandler:
 
             # Generate voice response
             await context.bot.send_chat_action(chat_id=chat_id, action="record_voice")
-            await update.message.reply_text("Recording answer for you...")
+            await telegram_sender.reply_text(
+                update.message, "Recording answer for you..."
+            )
 
             # Get the last bot response from the message history
-            from src.dal import MessagesRepository
+            from src.dal import AsyncMessagesRepository
 
-            last_messages = MessagesRepository.get_recent_messages(
+            last_messages = await AsyncMessagesRepository.get_recent_messages(
                 update.message.from_user.id, limit=1
             )
             if not last_messages:
                 logger.warning("No response found in message history")
                 return
 
-            last_response = last_messages[0]["message_text"]
+            last_response = last_messages[-1]["content"]
             logger.info("Converting bot response to voice")
 
             # Convert to voice and send
@@ -260,34 +265,41 @@ class VoiceHandler:
             if success:
                 # Send voice response
                 try:
+                    # Read up front: the call may be retried after a flood limit
                     with open(voice_path, "rb") as audio:
-                        await update.message.reply_voice(voice=audio)
+                        voice = audio.read()
+                    await telegram_sender.reply_voice(update.message, voice)
                     # Send text version
-                    await update.message.reply_text(
-                        f"Text version of my response:\n{last_response}"
+                    await telegram_sender.reply_text(
+                        update.message,
+                        f"Text version of my response:\n{last_response}",
                     )
                 except Exception as e:
                     logger.error(f"Error sending voice response: {e}", exc_info=True)
-                    await update.message.reply_text(
-                        "Sorry, I couldn't send the voice message, but here's my text response:\n{last_response}"
+                    await telegram_sender.reply_text(
+                        update.message,
+                        "Sorry, I couldn't send the voice message, but here's my text response:\n{last_response}",
                     )
             else:
                 logger.error(f"Failed to generate voice response: {voice_path}")
-                await update.message.reply_text(
-                    "Sorry, I couldn't generate a voice message, but here's my text response:\n{last_response}"
+                await telegram_sender.reply_text(
+                    update.message,
+                    "Sorry, I couldn't generate a voice message, but here's my text response:\n{last_response}",
                 )
 
         except Exception as e:
             logger.error(f"Error in voice message handler: {e}", exc_info=True)
-            await update.message.reply_text(
-                "Sorry, I encountered an error processing your voice message. Please try again."
+            await telegram_sender.reply_text(
+                update.message,
+                "Sorry, I encountered an error processing your voice message. Please try again.",
             )
         finally:
             processing_time = time.time() - start_time
             logger.info(f"Total voice message processing took {processing_time:.2f}s")
-            gc.collect()  # Final garbage collection
+            # Audio buffers are large, collect if that pushed RSS above the watermarks
+            memory_governor.maybe_collect()
 
-    def analyze_pronunciation(self, text: str, target_language: str) -> str:
+    async def analyze_pronunciation(self, text: str, target_language: str) -> str:
         """Analyze pronunciation and provide feedback"""
         # This uses your existing OpenAI integration
         from src.utils import generate_answer
@@ -304,4 +316,4 @@ class VoiceHandler:
         Keep the response brief and friendly.
         """
 
-        return generate_answer(prompt)
+        return await generate_answer(prompt)
@@ -0,0 +1,7 @@
+import os
+
+# Required settings of src.config, tests do not connect anywhere
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("LANGUAGE_MODEL", "test/model")
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
+os.environ.setdefault("DB_CONNECTION_STRING", "postgresql://test@localhost/test")
@@ -0,0 +1,96 @@
+import asyncio
+
+from src.llm_resilience import CLOSED, HALF_OPEN, OPEN, ResilientCaller
+
+MODEL = "test/model"
+
+
+def make_half_open_caller() -> ResilientCaller:
+    """Caller whose breaker opened after one failure and lets a trial through right away."""
+    caller = ResilientCaller(
+        deadline=1.0,
+        hedge_enabled=False,
+        hedge_percentile=0.95,
+        hedge_min_delay=0.0,
+        fallback_model="",
+        failure_threshold=1,
+        reset_seconds=0.0,
+    )
+    caller.breaker.record_failure()
+    assert caller.breaker.state == OPEN
+    return caller
+
+
+async def stream(caller: ResilientCaller, fail: bool = False):
+    """Streams like utils.stream_answer: the model is chosen first, then pieces are yielded."""
+    model = caller.model_for_stream(MODEL)
+    with caller.stream_outcome(model, MODEL):
+        yield "Hello"
+        await asyncio.sleep(0)
+        if fail:
+            raise ConnectionError("stream broken")
+        yield " world"
+
+
+def test_closed_stream_ends_half_open_trial():
+    caller = make_half_open_caller()
+
+    async def consume():
+        pieces = stream(caller)
+        assert await pieces.__anext__() == "Hello"
+        assert caller.breaker.state == HALF_OPEN
+        # No other trial while this one runs
+        assert not caller.breaker.allow()
+        await pieces.aclose()
+
+    asyncio.run(consume())
+    assert caller.breaker.state == HALF_OPEN
+    assert caller.breaker.allow()
+
+
+def test_cancelled_stream_ends_half_open_trial():
+    caller = make_half_open_caller()
+    started = asyncio.Event()
+
+    async def consume():
+        async for _ in stream(caller):
+            started.set()
+            await asyncio.sleep(10)
+
+    async def cancel_consumer():
+        task = asyncio.create_task(consume())
+        await started.wait()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_consumer())
+    assert caller.breaker.allow()
+
+
+def test_finished_stream_closes_breaker():
+    caller = make_half_open_caller()
+
+    async def consume():
+        return [piece async for piece in stream(caller)]
+
+    assert asyncio.run(consume()) == ["Hello", " world"]
+    assert caller.breaker.state == CLOSED
+
+
+def test_failed_stream_opens_breaker_again():
+    caller = make_half_open_caller()
+    caller.breaker.reset_seconds = 60.0
+
+    async def consume():
+        try:
+            async for _ in stream(caller, fail=True):
+                pass
+        except ConnectionError:
+            pass
+
+    asyncio.run(consume())
+    assert caller.breaker.state == OPEN
+    assert not caller.breaker.allow()